@@ -0,0 +1,86 @@
+from django.contrib import admin
+from django.http import HttpResponse
+
+from api.models import CacheConsumer, PurgeTask, RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created', 'method', 'path', 'view_name', 'status_code',
+                    'duration', 'display_queries_count', 'mode', 'user')
+    list_filter = ('view_name', 'mode', 'method')
+    list_select_related = ('user',)
+    readonly_fields = ('created', 'method', 'path', 'view_name',
+                       'status_code', 'duration', 'mode', 'user', 'profile',
+                       'display_queries')
+    exclude = ('queries',)
+    actions = ('export_flame_graph',)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Количество SQL-запросов')
+    def display_queries_count(self, obj):
+        return len(obj.queries)
+
+    @admin.display(description='SQL-запросы')
+    def display_queries(self, obj):
+        return '\n\n'.join(
+            f'[{query["time"]} с] {query["sql"]}' for query in obj.queries)
+
+    @admin.action(description='Выгрузить flame graph (folded stacks)')
+    def export_flame_graph(self, request, queryset):
+        """Объединяет стеки выбранных профилей, группируя по представлению.
+
+        Результат открывается flamegraph.pl или speedscope.
+        """
+        stacks = {}
+        for view_name, profile in queryset.filter(
+                mode=RequestProfile.SAMPLING).values_list(
+                    'view_name', 'profile').iterator():
+            for line in profile.splitlines():
+                stack, count = line.rsplit(' ', 1)
+                key = f'{view_name or "-"};{stack}'
+                stacks[key] = stacks.get(key, 0) + int(count)
+        content = '\n'.join(
+            f'{stack} {count}' for stack, count in sorted(stacks.items()))
+        response = HttpResponse(content, content_type='text/plain')
+        response['Content-Disposition'] = (
+            'attachment; filename="flamegraph.folded"'
+        )
+        return response
+
+
+@admin.register(PurgeTask)
+class PurgeTaskAdmin(admin.ModelAdmin):
+    list_display = ('created', 'kind', 'label', 'status', 'display_progress',
+                    'files_deleted', 'finished')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('kind', 'object_id', 'label', 'status', 'created',
+                       'started', 'finished', 'total', 'purged',
+                       'files_deleted', 'error')
+    actions = ('retry',)
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Прогресс')
+    def display_progress(self, obj):
+        if not obj.total:
+            return f'{obj.purged}'
+        percent = min(100, obj.purged * 100 // obj.total)
+        return f'{obj.purged} из {obj.total} ({percent}%)'
+
+    @admin.action(description='Повторить удаление')
+    def retry(self, request, queryset):
+        queryset.filter(status=PurgeTask.FAILED).update(
+            status=PurgeTask.PENDING, error='', finished=None)
+
+
+@admin.register(CacheConsumer)
+class CacheConsumerAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_seq', 'lag', 'updated')
+    readonly_fields = ('name', 'last_seq', 'lag', 'updated')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,79 @@
+"""Общие классы админки для больших таблиц."""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from api.constants import APPROXIMATE_COUNT_THRESHOLD
+from api.purge import delete_object
+
+
+class ApproximateCountPaginator(Paginator):
+    """Пагинатор, оценивающий размер большой таблицы без COUNT(*).
+
+    Для запроса без фильтров на PostgreSQL берется оценка планировщика
+    из pg_class.reltuples. Если таблица меньше порога или запрос
+    отфильтрован, выполняется обычный COUNT(*). Фильтр менеджера по
+    умолчанию (без помеченных на удаление) фильтром не считается: такие
+    записи очищаются в фоне и почти не меняют оценку.
+    """
+
+    def is_unfiltered(self, query):
+        manager = self.object_list.model._default_manager
+        return (not query.where
+                or query.where == manager.get_queryset().query.where)
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and self.is_unfiltered(query):
+            connection = connections[self.object_list.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT reltuples FROM pg_class WHERE relname = %s',
+                        [self.object_list.model._meta.db_table])
+                    row = cursor.fetchone()
+                if row and row[0] > APPROXIMATE_COUNT_THRESHOLD:
+                    return int(row[0])
+        return super().count
+
+
+class PrefixSearchMixin:
+    """Поиск по началу строки целиком, без разбиения на слова.
+
+    search_fields задаются с lookup startswith, чтобы поиск использовал
+    индексы (на PostgreSQL - varchar_pattern_ops). Поиск чувствителен к
+    регистру на PostgreSQL.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        query = Q()
+        for field in self.search_fields:
+            query |= Q(**{field: search_term})
+        return queryset.filter(query), False
+
+
+class BackgroundDeleteMixin:
+    """Удаление пользователей и рецептов через очередь фонового удаления
+    (api.purge).
+
+    Страница подтверждения не собирает все связанные объекты, как это
+    делает стандартная админка.
+    """
+
+    def delete_object(self, obj):
+        delete_object(obj)
+
+    def get_deleted_objects(self, objs, request):
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        self.delete_object(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_object(obj)
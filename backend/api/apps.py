@@ -2,4 +2,9 @@ from django.apps import AppConfig
 
 
 class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+    verbose_name = 'API'
+
+    def ready(self):
+        import api.signals  # noqa: F401
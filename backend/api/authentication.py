@@ -0,0 +1,64 @@
+"""Аутентификация по токену с кэшированием пользователей."""
+import copy
+
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from api.cache import LocalTTLCache
+from api.constants import (
+    AUTH_CACHE_TTL,
+    AUTH_LOCAL_CACHE_SIZE,
+    AUTH_LOCAL_CACHE_TTL
+)
+
+local_cache = LocalTTLCache(AUTH_LOCAL_CACHE_SIZE, AUTH_LOCAL_CACHE_TTL)
+
+
+def token_cache_key(key):
+    return f'auth:token:{key}'
+
+
+def user_cache_key(user_pk):
+    return f'auth:user:{user_pk}'
+
+
+def invalidate_token(key):
+    """Удаляет пользователя токена из локального и общего кэша."""
+    local_cache.delete(key)
+    cache.delete(token_cache_key(key))
+
+
+def invalidate_user(user_pk):
+    """Удаляет из кэша токен пользователя."""
+    key = cache.get(user_cache_key(user_pk))
+    if key is not None:
+        invalidate_token(key)
+        cache.delete(user_cache_key(user_pk))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену без запросов к базе при попадании в кэш.
+
+    Снимок пользователя хранится в локальном кэше процесса и в кэше
+    Django. Записи сбрасываются сигналами при удалении токена, изменении
+    или удалении пользователя. Кэш Django общий, только если в CACHES
+    задан общий бэкенд; по умолчанию это LocMemCache процесса, и оба
+    уровня в других процессах сбрасывает api.invalidation по событиям
+    токенов и пользователей.
+    """
+
+    def authenticate_credentials(self, key):
+        user = local_cache.get(key)
+        if user is None:
+            user = cache.get(token_cache_key(key))
+            if user is None:
+                user, _ = super().authenticate_credentials(key)
+                cache.set(token_cache_key(key), user, AUTH_CACHE_TTL)
+                cache.set(user_cache_key(user.pk), key, AUTH_CACHE_TTL)
+            local_cache.set(key, user)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                'Пользователь неактивен или удален.')
+        user = copy.copy(user)
+        return user, self.get_model()(key=key, user=user)
@@ -1,12 +1,23 @@
 """Базовые представления для проекта API"""
 from rest_framework import filters, mixins, viewsets
 
+from api.breaker import DegradedModeMixin
+from api.catalog import get_version
+from api.compression import PrecompressedCacheMixin
+from api.constants import CATALOG_CACHE_TTL, CATALOG_STATEMENT_TIMEOUT
+
 
 class TagIngredientBaseViewSet(
-    mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+    DegradedModeMixin, PrecompressedCacheMixin, mixins.RetrieveModelMixin,
+    mixins.ListModelMixin, viewsets.GenericViewSet
 ):
     """Базовое представление для меток и ингредиентов """
 
     filter_backends = (filters.SearchFilter,)
     search_fields = ('^name',)
     pagination_class = None
+    precompressed_cache_ttl = CATALOG_CACHE_TTL
+    statement_timeout = CATALOG_STATEMENT_TIMEOUT
+
+    def get_cache_version(self):
+        return get_version()
@@ -0,0 +1,107 @@
+"""Генерация тестовых данных для команд анализа производительности."""
+import random
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from recipes.constants import LENGTH_SHORT_CODE
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingcartRecipe,
+    Tag
+)
+from users.models import Subscription
+
+User = get_user_model()
+
+BATCH_SIZE = 1000  # Размер пачки для bulk_create
+INGREDIENTS_PER_RECIPE = 6  # Количество ингредиентов в рецепте
+
+
+class Rollback(Exception):
+    """Откат тестовых данных после анализа."""
+
+
+@contextmanager
+def rollback():
+    """Выполняет блок в транзакции и всегда откатывает ее."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def timeit(func, repeat):
+    """Среднее время выполнения func в миллисекундах."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def generate_dataset(users_count, recipes_count, ingredients_count,
+                     tags_count=3):
+    """Создает пользователей, рецепты, метки, избранное, корзину и подписки.
+
+    Возвращает пользователя с подписками, избранным и корзиной.
+    """
+    prefix = ''.join(random.choices('abcdefghij', k=6))
+    User.objects.bulk_create(
+        (User(email=f'{prefix}{i}@example.com',
+              username=f'{prefix}{i}', first_name='Имя',
+              last_name='Фамилия')
+         for i in range(users_count)),
+        batch_size=BATCH_SIZE)
+    users = list(User.objects.filter(username__startswith=prefix))
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=f'{prefix} ингредиент {i}', measurement_unit='г')
+         for i in range(ingredients_count)),
+        batch_size=BATCH_SIZE)
+    ingredients = list(Ingredient.objects.filter(name__startswith=prefix))
+    tags = [Tag.objects.create(name=f'{prefix} метка {i}',
+                               slug=f'{prefix}-{i}')
+            for i in range(tags_count)]
+    recipes = []
+    for i in range(recipes_count):
+        recipe_tags = random.sample(tags, random.randint(0, len(tags)))
+        recipe = Recipe(
+            author=random.choice(users), name=f'Рецепт {i}',
+            text='Описание', cooking_time=10, image='test.png',
+            short_code=f'{prefix[:2]}{i:0{LENGTH_SHORT_CODE - 2}}',
+            tags_mask=sum(tag.mask for tag in recipe_tags))
+        recipe.generated_tags = recipe_tags
+        recipes.append(recipe)
+    Recipe.objects.bulk_create(recipes, batch_size=BATCH_SIZE)
+    recipe_ids = dict(Recipe.objects.filter(
+        author__username__startswith=prefix).values_list('short_code', 'id'))
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe_id=recipe_id, ingredient=ingredient,
+                          amount=1)
+         for recipe_id in recipe_ids.values()
+         for ingredient in random.sample(
+             ingredients, INGREDIENTS_PER_RECIPE)),
+        batch_size=BATCH_SIZE)
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe_id=recipe_ids[recipe.short_code],
+                             tag=tag)
+         for recipe in recipes for tag in recipe.generated_tags),
+        batch_size=BATCH_SIZE)
+    recipe_ids = list(recipe_ids.values())
+    for model in (FavoriteRecipe, ShoppingcartRecipe):
+        model.objects.bulk_create(
+            (model(user=user, recipe_id=recipe_id)
+             for user in users[:100]
+             for recipe_id in random.sample(recipe_ids, 20)),
+            batch_size=BATCH_SIZE)
+    Subscription.objects.bulk_create(
+        (Subscription(user=users[0], following=following)
+         for following in users[1:51]),
+        batch_size=BATCH_SIZE)
+    return users[0]
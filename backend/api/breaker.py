@@ -0,0 +1,264 @@
+"""Работа чтения при перегрузке базы.
+
+Когда база отвечает медленно, запросы к ленте, справочникам и коротким
+ссылкам ждут ее и занимают все воркеры gunicorn. Представления с
+DegradedModeMixin ограничивают время каждого SQL-запроса
+(statement_timeout) и сообщают автомату breaker время SQL и ошибки
+базы. Если среди последних BREAKER_WINDOW запросов доля ошибок или
+среднее время SQL превышает порог, цепь размыкается на
+BREAKER_OPEN_TIME: чтение без данных пользователя отдает последний
+успешный ответ с заголовками Age и Warning, остальные запросы сразу
+получают 503 с Retry-After. Затем один пробный запрос проверяет базу и
+при успехе замыкает цепь, а адреса, отданные устаревшими, обновляются
+в фоне.
+
+Автомат и последние ответы хранятся в каждом процессе отдельно.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from django.core.cache import cache
+from django.db import InterfaceError, OperationalError, connection
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory
+from django.urls import resolve
+
+from api.cache import LocalTTLCache
+from api.compression import choose_encoding
+from api.constants import (
+    BREAKER_ERROR_RATE,
+    BREAKER_LATENCY,
+    BREAKER_MIN_REQUESTS,
+    BREAKER_OPEN_TIME,
+    BREAKER_WINDOW,
+    STALE_CACHE_SIZE,
+    STALE_CACHE_TTL,
+    STALE_REFRESH_LIMIT,
+    STALE_STORE_INTERVAL
+)
+from api.db import statement_timeout
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, говорящие о состоянии базы, а не о данных запроса.
+DATABASE_ERRORS = (OperationalError, InterfaceError)
+
+
+class CircuitBreaker:
+    """Автомат размыкания цепи по ошибкам и времени ответа базы."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, window=BREAKER_WINDOW,
+                 min_requests=BREAKER_MIN_REQUESTS,
+                 error_rate=BREAKER_ERROR_RATE, latency=BREAKER_LATENCY,
+                 open_time=BREAKER_OPEN_TIME):
+        self.results = deque(maxlen=window)
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.latency = latency
+        self.open_time = open_time
+        self.state = self.CLOSED
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Можно ли обращаться к базе.
+
+        Через open_time после размыкания пропускает один пробный запрос.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (self.state == self.OPEN
+                    and time.monotonic() >= self.opened + self.open_time):
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record(self, duration, failed):
+        """Учитывает запрос, возвращает True, если цепь замкнулась."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                if failed or duration >= self.latency:
+                    self.trip()
+                    return False
+                self.state = self.CLOSED
+                self.results.clear()
+                return True
+            if self.state == self.OPEN:
+                return False
+            self.results.append((duration, failed))
+            if len(self.results) < self.min_requests:
+                return False
+            errors = sum(failed for _, failed in self.results)
+            total = sum(duration for duration, _ in self.results)
+            if (errors >= self.error_rate * len(self.results)
+                    or total >= self.latency * len(self.results)):
+                self.trip()
+            return False
+
+    def skip(self):
+        """Запрос не обращался к базе: пробным будет следующий."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def trip(self):
+        self.state = self.OPEN
+        self.opened = time.monotonic()
+
+    def retry_after(self):
+        """Секунды до пробного запроса к базе."""
+        return max(1, math.ceil(
+            self.opened + self.open_time - time.monotonic()))
+
+
+breaker = CircuitBreaker()
+
+# Адреса, ответ которых сохранен недавно, и адреса, отданные
+# устаревшими, для обновления после восстановления базы.
+recently_stored = LocalTTLCache(STALE_CACHE_SIZE, STALE_STORE_INTERVAL)
+served_stale = {}
+
+
+def measure(durations):
+    """Обертка SQL-запросов, собирающая их время в durations."""
+    def wrapper(execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            durations.append(time.monotonic() - start)
+    return wrapper
+
+
+def unavailable_response():
+    response = JsonResponse(
+        {'detail': 'Сервис временно недоступен, повторите запрос позже.'},
+        status=503, json_dumps_params={'ensure_ascii': False})
+    response['Retry-After'] = breaker.retry_after()
+    return response
+
+
+class DegradedModeMixin:
+    """Ограничивает SQL-запросы представления и отдает последние ответы,
+    пока база перегружена.
+
+    Последний ответ хранится для чтения без данных пользователя
+    (is_public_request, если он есть у представления).
+    """
+
+    statement_timeout = None
+
+    def get_stale_key(self, request):
+        if request.method != 'GET':
+            return None
+        is_public = getattr(self, 'is_public_request', None)
+        if is_public is not None and not is_public(request):
+            return None
+        key = (f'{type(self).__name__}:{request.get_full_path()}:'
+               f'{request.META.get("HTTP_ACCEPT", "")}:'
+               f'{choose_encoding(request)}')
+        return f'stale:{hashlib.md5(key.encode()).hexdigest()}'
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_stale_key(request)
+        if not breaker.allow_request():
+            return self.degraded_response(request, key)
+        durations = []
+        try:
+            with statement_timeout(self.statement_timeout), \
+                    connection.execute_wrapper(measure(durations)):
+                response = super().dispatch(request, *args, **kwargs)
+        except DATABASE_ERRORS as error:
+            breaker.record(sum(durations), True)
+            logger.warning('Ошибка базы в %s: %s', request.path, error)
+            return self.degraded_response(request, key)
+        if not durations:
+            breaker.skip()
+        elif breaker.record(sum(durations), False):
+            start_refresh()
+        if (key is not None and response.status_code in (200, 302)
+                and not response.streaming):
+            self.store(key, response)
+        return response
+
+    def store(self, key, response):
+        """Сохраняет ответ не чаще STALE_STORE_INTERVAL для адреса."""
+        if recently_stored.get(key):
+            return
+        if not getattr(response, 'is_rendered', True):
+            response.render()
+        cache.set(key, {
+            'status': response.status_code,
+            'content': response.content,
+            'headers': [
+                (name, value) for name, value in response.items()
+                if name.lower() != 'content-length'
+            ],
+            'stored': time.time(),
+        }, STALE_CACHE_TTL)
+        recently_stored.set(key, True)
+
+    def degraded_response(self, request, key):
+        """Последний успешный ответ или 503 с Retry-After."""
+        entry = cache.get(key) if key is not None else None
+        if entry is None:
+            return unavailable_response()
+        if len(served_stale) < STALE_REFRESH_LIMIT:
+            served_stale[key] = {
+                'path': request.get_full_path(),
+                'secure': request.is_secure(),
+                'host': request.get_host(),
+                'headers': {
+                    name: request.META[name]
+                    for name in ('HTTP_ACCEPT', 'HTTP_ACCEPT_ENCODING')
+                    if name in request.META
+                },
+            }
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for name, value in entry['headers']:
+            response[name] = value
+        response['Age'] = int(time.time() - entry['stored'])
+        response['Warning'] = '110 - "Response is Stale"'
+        return response
+
+
+def refresh_stale():
+    """Заново запрашивает адреса, отданные устаревшими.
+
+    Запросы выполняются в этом процессе через представления, которые
+    сохраняют свежие ответы. Обновление прекращается, если цепь снова
+    разомкнулась.
+    """
+    factory = RequestFactory()
+    try:
+        while served_stale and breaker.state == breaker.CLOSED:
+            key, info = served_stale.popitem()
+            request = factory.get(
+                info['path'], secure=info['secure'], HTTP_HOST=info['host'],
+                HTTP_CACHE_CONTROL='no-cache', **info['headers'])
+            # Просмотры при обновлении не учитываются.
+            request.stale_refresh = True
+            recently_stored.delete(key)
+            match = resolve(urlsplit(info['path']).path)
+            try:
+                match.func(request, *match.args, **match.kwargs)
+            except Exception as error:
+                logger.warning('Ответ %s не обновлен: %s', info['path'],
+                               error)
+    finally:
+        connection.close()
+
+
+def start_refresh():
+    if served_stale:
+        threading.Thread(target=refresh_stale, daemon=True).start()
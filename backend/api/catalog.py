@@ -0,0 +1,107 @@
+"""Версионирование справочников меток и ингредиентов.
+
+Версия справочников - номер последней записи CatalogChange. Клиент
+загружает полный снимок один раз, а затем запрашивает только изменения
+после известной ему версии. Снимок пишется в media один раз на версию
+в виде JSON и его сжатых копий (gzip и brotli) и отдается веб-сервером
+как статика.
+
+Версия служит курсором только потому, что записи CatalogChange
+фиксируются по возрастанию номера (CatalogChange.record пишет их под
+блокировкой CatalogLock). Изменения справочников в обход record,
+например bulk_create и update без сигналов, версию не меняют - такие
+объекты нужно дописать через CatalogChange.record_untracked.
+"""
+import json
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Max
+
+from api.compression import ENCODINGS, compress
+from api.constants import CATALOG_SNAPSHOT_DIR
+from api.serializers import IngredientSerializer, TagSerializer
+from recipes.models import CatalogChange, Ingredient, Tag
+
+CATALOGS = (
+    ('ingredients', CatalogChange.INGREDIENT, Ingredient,
+     IngredientSerializer),
+    ('tags', CatalogChange.TAG, Tag, TagSerializer),
+)
+
+# Расширения сжатых копий снимка для gzip_static и brotli_static nginx.
+SUFFIXES = {'gzip': 'gz', 'br': 'br'}
+
+
+def get_version():
+    return CatalogChange.objects.aggregate(
+        version=Max('seq'))['version'] or 0
+
+
+def get_changes(since):
+    """Изменения справочников после версии since.
+
+    Для каждого справочника возвращаются актуальные объекты, измененные
+    после since, и id удаленных объектов.
+    """
+    version = get_version()
+    changes = {'version': version}
+    for name, kind, model, serializer in CATALOGS:
+        last_changes = {}
+        for object_id, deleted in CatalogChange.objects.filter(
+                kind=kind, seq__gt=since, seq__lte=version).order_by(
+                    'seq').values_list('object_id', 'deleted'):
+            last_changes[object_id] = deleted
+        changed = [pk for pk, deleted in last_changes.items() if not deleted]
+        objects = model.objects.filter(pk__in=changed).order_by('pk')
+        changes[name] = serializer(objects, many=True).data
+        changes[f'deleted_{name}'] = sorted(
+            pk for pk, deleted in last_changes.items() if deleted)
+    return changes
+
+
+def build_snapshot():
+    """Полный снимок справочников."""
+    snapshot = {'version': get_version()}
+    for name, _, model, serializer in CATALOGS:
+        snapshot[name] = serializer(
+            model.objects.order_by('pk'), many=True).data
+    return snapshot
+
+
+def save_file(name, content):
+    """Сохраняет файл, если его еще нет, и возвращает его имя."""
+    if default_storage.exists(name):
+        return name
+    saved = default_storage.save(name, ContentFile(content))
+    if saved != name:
+        # Снимок той же версии уже записан параллельным запросом.
+        default_storage.delete(saved)
+    return name
+
+
+def get_snapshot_name():
+    """Имя файла снимка текущей версии, снимок создается при отсутствии."""
+    name = f'{CATALOG_SNAPSHOT_DIR}/catalog-{get_version()}.json'
+    if default_storage.exists(name):
+        return name
+    snapshot = build_snapshot()
+    # Версия могла измениться, пока снимок собирался.
+    name = f'{CATALOG_SNAPSHOT_DIR}/catalog-{snapshot["version"]}.json'
+    content = json.dumps(
+        snapshot, ensure_ascii=False, separators=(',', ':')).encode()
+    for encoding in ENCODINGS:
+        save_file(f'{name}.{SUFFIXES[encoding]}',
+                  compress(content, encoding, static=True))
+    save_file(name, content)
+    delete_old_snapshots(name)
+    return name
+
+
+def delete_old_snapshots(name):
+    """Удаляет снимки прошлых версий."""
+    _, files = default_storage.listdir(CATALOG_SNAPSHOT_DIR)
+    current = name.rsplit('/', 1)[-1]
+    for file in files:
+        if file.startswith('catalog-') and not file.startswith(current):
+            default_storage.delete(f'{CATALOG_SNAPSHOT_DIR}/{file}')
@@ -0,0 +1,198 @@
+"""Сжатие ответов gzip и brotli с учетом Accept-Encoding.
+
+CompressionMiddleware сжимает ответы, в том числе потоковые, на лету.
+Ответы, одинаковые для многих клиентов (справочники, лента рецептов без
+данных пользователя), PrecompressedCacheMixin сохраняет в кэше сразу в
+исходном и сжатом виде с максимальной степенью сжатия, поэтому
+повторные запросы отдаются без сериализации и повторного сжатия.
+Brotli используется при установленном пакете Brotli.
+"""
+import gzip
+import hashlib
+import re
+import zlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from api.constants import (
+    BROTLI_QUALITY,
+    BROTLI_STATIC_QUALITY,
+    COMPRESSION_MIN_SIZE,
+    GZIP_LEVEL
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Кодировки в порядке предпочтения.
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+COMPRESSIBLE_RE = re.compile(
+    r'^(text/|application/(json|javascript|xml)|image/svg\+xml)')
+QUALITY_RE = re.compile(r'q=([0-9.]+)')
+
+
+def choose_encoding(request):
+    """Лучшая кодировка из Accept-Encoding или None."""
+    accepted = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = item.partition(';')
+        match = QUALITY_RE.search(params)
+        try:
+            accepted[name.strip().lower()] = (
+                float(match.group(1)) if match else 1)
+        except ValueError:
+            continue
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, static=False):
+    """Сжимает данные целиком, static - максимальная степень сжатия."""
+    if encoding == 'br':
+        return brotli.compress(
+            data, quality=BROTLI_STATIC_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else GZIP_LEVEL,
+                         mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Сжимает поток, отдавая сжатые данные после каждого блока."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = (
+            compressor.process, compressor.flush, compressor.finish)
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+    for chunk in chunks:
+        data = process(bytes(chunk)) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def is_compressible(response):
+    return (response.status_code == 200
+            and not response.has_header('Content-Encoding')
+            and COMPRESSIBLE_RE.match(response.get('Content-Type', '')))
+
+
+class CompressionMiddleware:
+    """Сжимает ответы текстовых форматов."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not is_compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < COMPRESSION_MIN_SIZE:
+                return response
+            content = compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+        # Сжатый ответ не совпадает побайтно с исходным.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+
+def build_entry(response):
+    """Запись кэша: заголовки, исходное и сжатые тела ответа."""
+    content = response.content
+    entry = {
+        'headers': [
+            (name, value) for name, value in response.items()
+            if name.lower() != 'content-length'
+        ],
+        'identity': content,
+    }
+    if len(content) >= COMPRESSION_MIN_SIZE:
+        for encoding in ENCODINGS:
+            entry[encoding] = compress(content, encoding, static=True)
+    return entry
+
+
+def entry_response(request, entry):
+    """Ответ из записи кэша в кодировке, которую принимает клиент."""
+    encoding = choose_encoding(request)
+    response = HttpResponse(entry.get(encoding, entry['identity']))
+    for name, value in entry['headers']:
+        response[name] = value
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if encoding in entry:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+class PrecompressedCacheMixin:
+    """Кэширует JSON-ответы списка в исходном и сжатом виде.
+
+    Представление определяет, можно ли кэшировать запрос
+    (is_public_request), срок хранения (precompressed_cache_ttl) и версию
+    данных, с изменением которой записи перестают использоваться
+    (get_cache_version). Запрос с Cache-Control: no-cache выполняется
+    без кэша.
+    """
+
+    precompressed_actions = ('list',)
+    precompressed_cache_ttl = 60
+
+    def is_public_request(self, request):
+        """Ответ не зависит от пользователя."""
+        return True
+
+    def get_cache_version(self):
+        return None
+
+    def get_cache_key(self, request):
+        action = self.action_map.get(request.method.lower())
+        if (request.method != 'GET'
+                or action not in self.precompressed_actions
+                or 'no-cache' in request.headers.get('Cache-Control', '')
+                or not self.is_public_request(request)):
+            return None
+        key = (f'{type(self).__name__}:{self.get_cache_version()}:'
+               f'{request.get_full_path()}:'
+               f'{request.META.get("HTTP_ACCEPT", "")}')
+        return f'precompressed:{hashlib.md5(key.encode()).hexdigest()}'
+
+    def dispatch(self, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        if key is None:
+            return super().dispatch(request, *args, **kwargs)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry_response(request, entry)
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if (response.status_code != 200 or renderer is None
+                or renderer.format != 'json'):
+            return response
+        response.render()
+        entry = build_entry(response)
+        cache.set(key, entry, self.precompressed_cache_ttl)
+        return entry_response(request, entry)
@@ -0,0 +1,58 @@
+"""Константы для API."""
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24  # Время хранения ответа по Idempotency-Key
+BATCH_MAX_SIZE = 100  # Максимальное количество id в пакетном запросе
+AUTH_CACHE_TTL = 60 * 5  # Время хранения пользователя токена в общем кэше
+AUTH_LOCAL_CACHE_TTL = 30  # Время хранения пользователя в кэше процесса
+AUTH_LOCAL_CACHE_SIZE = 1024  # Количество токенов в кэше процесса
+PROFILE_HEADER = 'X-Profile'  # Заголовок для профилирования запроса
+PROFILE_SAMPLING_INTERVAL = 0.005  # Интервал снятия стека, с
+PROFILE_TOP_FUNCTIONS = 50  # Количество функций в отчете cProfile
+APPROXIMATE_COUNT_THRESHOLD = 100000  # Размер таблицы для оценки количества
+CATALOG_SNAPSHOT_DIR = 'catalog'  # Каталог снимков справочников в media
+USER_STATE_PARAM = 'user_state'  # Параметр для ответа без данных пользователя
+PUBLIC_CACHE_MAX_AGE = 60  # Время кэширования ответа без данных пользователя
+EXPORT_CHUNK_SIZE = 64 * 1024  # Размер блока архива выгрузки, байт
+EXPORT_BATCH_SIZE = 500  # Количество записей, читаемых из базы за раз
+PURGE_BATCH_SIZE = 500  # Количество записей, удаляемых одной транзакцией
+PURGE_MAX_DEPTH = 5  # Глубина связей при оценке объема удаления
+PURGE_POLL_INTERVAL = 10  # Период проверки очереди удаления, с
+SQLITE_LOCK_RETRIES = 5  # Попыток записи при занятой базе SQLite
+SQLITE_LOCK_RETRY_DELAY = 0.05  # Начальная задержка повтора записи, с
+COMPRESSION_MIN_SIZE = 200  # Минимальный размер сжимаемого ответа, байт
+GZIP_LEVEL = 6  # Степень сжатия gzip при сжатии на лету
+BROTLI_QUALITY = 4  # Качество brotli при сжатии на лету
+BROTLI_STATIC_QUALITY = 11  # Качество brotli для ответов из кэша и снимков
+CATALOG_CACHE_TTL = 60 * 60  # Время хранения сжатых ответов справочников
+FEED_CACHE_TTL = 15  # Время хранения сжатых страниц ленты без пользователя
+FIELDS_PARAM = 'fields'  # Параметр списка полей ответа
+OMIT_PARAM = 'omit'  # Параметр списка исключаемых полей ответа
+MEDIA_GC_BATCH_SIZE = 500  # Количество файлов, проверяемых за раз
+MEDIA_GC_GRACE_PERIOD = 60 * 60  # Возраст файла без ссылок для удаления, с
+MEDIA_GC_CURSOR = '.media-gc-cursor'  # Файл позиции обхода в MEDIA_ROOT
+UPLOAD_MAX_SIZE = 10 * 1024 * 1024  # Максимальный размер изображения, байт
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Размер блока записи загрузки, байт
+UPLOAD_TTL = 60 * 60 * 24  # Время хранения загрузки, с
+UPLOAD_TOKEN_BYTES = 24  # Длина случайной части токена загрузки, байт
+PUBLISH_FEED_PAGES = 5  # Количество публикуемых страниц каждой ленты
+PUBLISH_PAGE_SIZE = 6  # Количество рецептов на публикуемой странице ленты
+PUBLISH_BATCH_SIZE = 500  # Количество рецептов, публикуемых за раз
+PUBLISH_POLL_INTERVAL = 2  # Период проверки очереди публикации, с
+INVALIDATION_CHANNEL = 'cache_invalidation'  # Канал LISTEN/NOTIFY PostgreSQL
+INVALIDATION_POLL_INTERVAL = 1  # Период опроса событий сброса кэша, с
+INVALIDATION_LISTEN_TIMEOUT = 30  # Опрос при ожидании уведомлений, с
+INVALIDATION_BATCH_SIZE = 500  # Количество событий, читаемых за раз
+INVALIDATION_REPORT_INTERVAL = 10  # Период записи задержки процесса, с
+INVALIDATION_EVENT_TTL = 60 * 60  # Время хранения событий сброса кэша, с
+SQLITE_PROGRESS_STEPS = 1000  # Шаг проверки времени запроса SQLite
+RECIPES_STATEMENT_TIMEOUT = 2  # Ограничение SQL-запроса рецептов, с
+CATALOG_STATEMENT_TIMEOUT = 1  # Ограничение SQL-запроса справочников, с
+SHORT_LINK_STATEMENT_TIMEOUT = 0.5  # Ограничение SQL-запроса ссылки, с
+BREAKER_WINDOW = 50  # Количество последних запросов для оценки базы
+BREAKER_MIN_REQUESTS = 10  # Минимум запросов для размыкания цепи
+BREAKER_ERROR_RATE = 0.5  # Доля ошибок базы для размыкания цепи
+BREAKER_LATENCY = 1.0  # Среднее время SQL на запрос для размыкания, с
+BREAKER_OPEN_TIME = 10  # Время до пробного запроса к базе, с
+STALE_CACHE_TTL = 60 * 60 * 24  # Время хранения последнего ответа, с
+STALE_STORE_INTERVAL = 5  # Период обновления последнего ответа, с
+STALE_CACHE_SIZE = 4096  # Количество адресов с недавно сохраненным ответом
+STALE_REFRESH_LIMIT = 1000  # Количество адресов для обновления после сбоя
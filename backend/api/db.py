@@ -0,0 +1,106 @@
+"""Настройка SQLite для работы нескольких процессов на одном узле.
+
+По умолчанию SQLite ведет журнал отката (journal_mode=DELETE): пока
+один процесс пишет, остальные не могут читать. В режиме WAL читатели не
+ждут писателя, поэтому запись в избранное не блокирует ленту рецептов.
+Настройки применяются к каждому новому соединению.
+
+Писатели по-прежнему выполняются по одному. Транзакция, которая начала
+с чтения и затем пишет, получает "database is locked" сразу, без
+ожидания busy_timeout, если другой процесс уже пишет. Такие блоки
+повторяются декоратором retry_on_locked.
+"""
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connection
+
+from api.constants import (
+    SQLITE_LOCK_RETRIES,
+    SQLITE_LOCK_RETRY_DELAY,
+    SQLITE_PROGRESS_STEPS
+)
+
+
+def configure_sqlite(connection):
+    """Применяет PRAGMA из settings.SQLITE_PRAGMAS к соединению SQLite."""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked_error(error):
+    return 'database is locked' in str(error) or (
+        'database table is locked' in str(error))
+
+
+def retry_on_locked(func):
+    """Повторяет запись, если база SQLite занята другим процессом.
+
+    Повтор возможен только вне внешней транзакции: внутри нее ошибка
+    прерывает всю транзакцию, и повторять нужно ее целиком.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(SQLITE_LOCK_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if (not is_locked_error(error)
+                        or connection.in_atomic_block
+                        or attempt == SQLITE_LOCK_RETRIES - 1):
+                    raise
+            time.sleep(
+                SQLITE_LOCK_RETRY_DELAY * 2 ** attempt * random.random())
+    return wrapper
+
+
+def interrupt_sqlite(seconds):
+    """Обертка запросов SQLite, прерывающая их дольше seconds."""
+    def wrapper(execute, sql, params, many, context):
+        database = context['connection'].connection
+        deadline = time.monotonic() + seconds
+        database.set_progress_handler(
+            lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            database.set_progress_handler(None, 0)
+    return wrapper
+
+
+@contextmanager
+def statement_timeout(seconds):
+    """Ограничивает время каждого SQL-запроса внутри блока.
+
+    PostgreSQL прерывает запрос по statement_timeout, SQLite - по
+    обработчику прогресса. В обоих случаях запрос завершается
+    OperationalError.
+    """
+    if not seconds:
+        yield
+        return
+    if connection.vendor == 'sqlite':
+        with connection.execute_wrapper(interrupt_sqlite(seconds)):
+            yield
+        return
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SET statement_timeout = %s', [int(seconds * 1000)])
+    try:
+        yield
+    finally:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SET statement_timeout = DEFAULT')
+        except DatabaseError:
+            # Соединение с прежним ограничением не должно вернуться
+            # в работу.
+            connection.close()
@@ -0,0 +1,327 @@
+"""Выгрузка всех данных пользователя в ZIP-архив.
+
+Архив содержит профиль, рецепты, избранное, список покупок и подписки
+в формате JSON Lines и исходные файлы изображений. Записи читаются
+из базы пачками через iterator (на PostgreSQL - серверный курсор),
+файлы - блоками, а архив отдается клиенту по мере формирования, поэтому
+память не зависит от объема данных.
+
+Одновременно с отдачей архив записывается в EXPORT_ROOT, после обрыва
+соединения - в фоновом потоке. Повторные запросы с заголовком Range при
+неизменных данных (тот же ETag) обслуживаются из этого файла, что
+позволяет докачку.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import zipfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import Count, Max
+
+from api.constants import EXPORT_BATCH_SIZE, EXPORT_CHUNK_SIZE
+from recipes.models import (
+    CatalogChange,
+    FavoriteRecipe,
+    Recipe,
+    ShoppingcartRecipe
+)
+from users.models import Subscription
+
+# Фиксированное время записей архива: одинаковые данные дают одинаковые
+# байты архива.
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+logger = logging.getLogger(__name__)
+
+# Архивы, формируемые в фоне после обрыва загрузки.
+building = set()
+building_lock = threading.Lock()
+
+
+class ChunkWriter:
+    """Поток без перемотки, накапливающий данные до их отдачи."""
+
+    def __init__(self, file=None):
+        self.chunks = []
+        self.size = 0
+        self.file = file
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.size += len(data)
+        if self.file:
+            self.file.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_etag(user):
+    """ETag архива: меняется при изменении данных, попадающих в архив.
+
+    Кроме профиля и рецептов пользователя учитываются версия
+    справочников (названия ингредиентов и меток), изменения рецептов в
+    избранном и списке покупок, число записей в них (рецепт мог быть
+    удален или скрыт) и имена авторов в подписках.
+    """
+    recipes = user.recipes.aggregate(
+        count=Count('pk'), updated=Max('updated'))
+    state = user.state_changes.aggregate(cursor=Max('seq'))
+    catalog = CatalogChange.objects.aggregate(version=Max('seq'))
+    relations = [
+        model.objects.filter(
+            user=user, recipe__deleted_at__isnull=True).aggregate(
+                count=Count('pk'), updated=Max('recipe__updated'))
+        for model in (FavoriteRecipe, ShoppingcartRecipe)
+    ]
+    following = hashlib.sha256()
+    for username in Subscription.objects.filter(user=user).order_by(
+            'pk').values_list('following__username', flat=True).iterator(
+                chunk_size=EXPORT_BATCH_SIZE):
+        following.update(f'{username}\n'.encode())
+    fingerprint = (
+        user.pk, user.username, user.email, user.first_name,
+        user.last_name, user.avatar.name, recipes['count'],
+        recipes['updated'], state['cursor'], catalog['version'],
+        relations, following.hexdigest(),
+    )
+    return hashlib.sha256(repr(fingerprint).encode()).hexdigest()[:32]
+
+
+def get_archive_path(user, etag):
+    return os.path.join(settings.EXPORT_ROOT, f'{user.pk}-{etag}.zip')
+
+
+def recipe_lines(user):
+    """Строки recipes.jsonl."""
+    recipes = user.recipes.order_by('pk').values_list(
+        'pk', 'name', 'text', 'cooking_time', 'pub_date', 'image')
+    for chunk in chunked(recipes.iterator(chunk_size=EXPORT_BATCH_SIZE),
+                         EXPORT_BATCH_SIZE):
+        recipe_ids = [recipe[0] for recipe in chunk]
+        tags = {}
+        for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids).order_by(
+                    'tag__slug').values_list('recipe_id', 'tag__slug'):
+            tags.setdefault(recipe_id, []).append(slug)
+        ingredients = {}
+        for recipe_id, name, unit, amount in (
+                Recipe.ingredients.through.objects.filter(
+                    recipe_id__in=recipe_ids).order_by(
+                        'ingredient__name').values_list(
+                            'recipe_id', 'ingredient__name',
+                            'ingredient__measurement_unit', 'amount')):
+            ingredients.setdefault(recipe_id, []).append(
+                {'name': name, 'measurement_unit': unit, 'amount': amount})
+        for pk, name, text, cooking_time, pub_date, image in chunk:
+            yield {
+                'id': pk,
+                'name': name,
+                'text': text,
+                'cooking_time': cooking_time,
+                'pub_date': pub_date.isoformat(),
+                'tags': tags.get(pk, []),
+                'ingredients': ingredients.get(pk, []),
+                'image': f'images/{image}' if image else None,
+            }
+
+
+def relation_lines(queryset, *fields):
+    rows = queryset.order_by('pk').values(*fields)
+    yield from rows.iterator(chunk_size=EXPORT_BATCH_SIZE)
+
+
+def write_jsonl(archive, writer, name, lines):
+    """Пишет записи в файл архива, отдавая накопленные данные."""
+    with archive.open(zip_info(name), 'w') as file:
+        for line in lines:
+            file.write(json.dumps(line, ensure_ascii=False).encode())
+            file.write(b'\n')
+            if writer.size >= EXPORT_CHUNK_SIZE:
+                yield writer.pop()
+
+
+def write_file(archive, writer, name, storage_name):
+    """Копирует файл из хранилища в архив блоками."""
+    if not storage_name or not default_storage.exists(storage_name):
+        return
+    with default_storage.open(storage_name, 'rb') as source, \
+            archive.open(zip_info(name), 'w') as file:
+        while True:
+            data = source.read(EXPORT_CHUNK_SIZE)
+            if not data:
+                break
+            file.write(data)
+            if writer.size >= EXPORT_CHUNK_SIZE:
+                yield writer.pop()
+
+
+def zip_info(name):
+    info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def generate_archive(user, file=None):
+    """Формирует архив по частям, копируя его в file при наличии."""
+    writer = ChunkWriter(file)
+    with zipfile.ZipFile(writer, 'w') as archive:
+        profile = {
+            'id': user.pk,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'avatar': f'avatar/{user.avatar.name}' if user.avatar else None,
+        }
+        yield from write_jsonl(archive, writer, 'profile.jsonl', [profile])
+        yield from write_jsonl(
+            archive, writer, 'recipes.jsonl', recipe_lines(user))
+        for name, model in (('favorites.jsonl', FavoriteRecipe),
+                            ('shopping_cart.jsonl', ShoppingcartRecipe)):
+            yield from write_jsonl(
+                archive, writer, name, relation_lines(
+                    model.objects.filter(
+                        user=user, recipe__deleted_at__isnull=True),
+                    'recipe_id', 'recipe__name'))
+        yield from write_jsonl(
+            archive, writer, 'subscriptions.jsonl', relation_lines(
+                Subscription.objects.filter(user=user),
+                'following_id', 'following__username'))
+        if user.avatar:
+            yield from write_file(archive, writer,
+                                  profile['avatar'], user.avatar.name)
+        images = user.recipes.exclude(image='').order_by('pk').values_list(
+            'image', flat=True).iterator(chunk_size=EXPORT_BATCH_SIZE)
+        for image in images:
+            yield from write_file(archive, writer, f'images/{image}', image)
+    yield writer.pop()
+
+
+def stream_archive(user, etag):
+    """Отдает архив и сохраняет его копию для докачки.
+
+    Если клиент прервал загрузку, недописанный файл удаляется, а архив
+    для докачки формируется в фоне (build_in_background), не занимая
+    запрос.
+    """
+    os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+    path = get_archive_path(user, etag)
+    file = tempfile.NamedTemporaryFile(
+        dir=settings.EXPORT_ROOT, suffix='.part', delete=False)
+    try:
+        with file:
+            yield from generate_archive(user, file)
+    except GeneratorExit:
+        os.remove(file.name)
+        build_in_background(user, etag)
+        raise
+    except BaseException:
+        os.remove(file.name)
+        raise
+    save_archive(user, file.name, path)
+
+
+def save_archive(user, part_path, path):
+    os.replace(part_path, path)
+    delete_old_archives(user, path)
+
+
+def build_in_background(user, etag):
+    """Формирует архив в потоке процесса, один раз для каждого ETag."""
+    path = get_archive_path(user, etag)
+    with building_lock:
+        if path in building:
+            return
+        building.add(path)
+
+    def build():
+        try:
+            build_archive(user, etag)
+        except Exception as error:
+            logger.warning('Архив %s не сформирован: %s', path, error)
+        finally:
+            connection.close()
+            with building_lock:
+                building.discard(path)
+
+    threading.Thread(target=build, daemon=True).start()
+
+
+def build_archive(user, etag):
+    """Создает архив в EXPORT_ROOT, если его еще нет, и возвращает путь."""
+    path = get_archive_path(user, etag)
+    if not os.path.exists(path):
+        for _ in stream_archive(user, etag):
+            pass
+    return path
+
+
+def delete_old_archives(user, path):
+    """Удаляет архивы пользователя с устаревшими данными."""
+    prefix = f'{user.pk}-'
+    for name in os.listdir(settings.EXPORT_ROOT):
+        old_path = os.path.join(settings.EXPORT_ROOT, name)
+        if (name.startswith(prefix) and name.endswith('.zip')
+                and old_path != path):
+            os.remove(old_path)
+
+
+def parse_range(header, size):
+    """Возвращает (начало, конец) для одного диапазона Range.
+
+    None - заголовок не поддерживается и отдается весь архив,
+    ValueError - диапазон за пределами архива.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, end):
+    """Читает диапазон файла блоками."""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining:
+            data = file.read(min(EXPORT_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
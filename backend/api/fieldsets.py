@@ -0,0 +1,104 @@
+"""Выборочные поля ответа: параметры ?fields= и ?omit=.
+
+fields оставляет в ответе только перечисленные через запятую поля
+верхнего уровня, omit убирает перечисленные. По выбранным полям
+сокращается и запрос: столбцы ненужных полей не загружаются (defer),
+а prefetch_related и подзапросы Exists выполняются только для
+выводимых полей. Без параметров ответ не меняется.
+"""
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+from api.constants import FIELDS_PARAM, OMIT_PARAM
+from recipes.models import (
+    FavoriteRecipe,
+    Recipe,
+    RecipeIngredient,
+    ShoppingcartRecipe
+)
+from users.models import Subscription
+
+# Столбцы рецепта, нужные для ShortRecipeReadSerializer.
+SHORT_RECIPE_COLUMNS = ('id', 'author_id', 'name', 'image', 'cooking_time',
+                        'pub_date')
+
+
+def parse_fields(request):
+    """Возвращает (fields, omit), fields - None без параметра."""
+    def split(name):
+        value = request.query_params.get(name)
+        if value is None:
+            return None
+        return {item.strip() for item in value.split(',') if item.strip()}
+
+    return split(FIELDS_PARAM), split(OMIT_PARAM) or set()
+
+
+def requested_fields(request, names):
+    """Поля из names, выбранные параметрами запроса."""
+    if request is None:
+        return list(names)
+    only, omit = parse_fields(request)
+    unknown = ((only or set()) | omit) - set(names)
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: [
+            f'Неизвестные поля: {", ".join(sorted(unknown))}.']})
+    return [name for name in names
+            if (only is None or name in only) and name not in omit]
+
+
+def select_fields(serializer, fields):
+    """Оставляет поля сериализатора верхнего уровня, выбранные в запросе."""
+    root = serializer.root
+    if serializer is not root and not (
+            isinstance(root, ListSerializer) and serializer is root.child):
+        return fields
+    selected = requested_fields(serializer.context.get('request'), fields)
+    return {name: fields[name] for name in selected}
+
+
+def defer_columns(queryset, serializer_fields, fields):
+    """Откладывает загрузку столбцов невыводимых полей модели."""
+    columns = {field.name for field in queryset.model._meta.concrete_fields}
+    deferred = (set(serializer_fields) - set(fields)) & columns
+    return queryset.defer(*deferred) if deferred else queryset
+
+
+def prune_recipe_queryset(queryset, serializer_fields, fields, user):
+    """Запрос рецептов только для выводимых полей."""
+    queryset = defer_columns(queryset, serializer_fields, fields)
+    if 'author' in fields:
+        queryset = queryset.select_related('author')
+    if 'tags' in fields:
+        queryset = queryset.prefetch_related('tags')
+    if 'ingredients' in fields:
+        queryset = queryset.prefetch_related(Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related('ingredient')))
+    if user.is_authenticated:
+        if 'is_favorited' in fields:
+            queryset = queryset.annotate(favorited=Exists(
+                FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk'))))
+        if 'is_in_shopping_cart' in fields:
+            queryset = queryset.annotate(in_shopping_cart=Exists(
+                ShoppingcartRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk'))))
+    return queryset
+
+
+def prune_user_queryset(queryset, serializer_fields, fields, user):
+    """Запрос пользователей только для выводимых полей."""
+    queryset = defer_columns(queryset, serializer_fields, fields)
+    if 'is_subscribed' in fields and user.is_authenticated:
+        queryset = queryset.annotate(subscribed=Exists(
+            Subscription.objects.filter(
+                user=user, following=OuterRef('pk'))))
+    if 'recipes' in fields:
+        queryset = queryset.prefetch_related(Prefetch(
+            'recipes', queryset=Recipe.objects.only(*SHORT_RECIPE_COLUMNS)))
+    if 'recipes_count' in fields:
+        queryset = queryset.annotate(recipes_total=Count(
+            'recipes', filter=Q(recipes__deleted_at__isnull=True)))
+    return queryset
@@ -1,4 +1,5 @@
 """Фильтры представлений."""
+from django.db.models import F
 from django_filters.rest_framework import (
     BooleanFilter,
     CharFilter,
@@ -16,11 +17,32 @@ class RecipeFilter(FilterSet):
         method='filter_is_in_shopping_cart')
     tags = ModelMultipleChoiceFilter(
         field_name='tags__slug', to_field_name='slug',
-        conjoined=False, queryset=Tag.objects.all())
+        queryset=Tag.objects.all(), method='filter_tags')
+    all_tags = ModelMultipleChoiceFilter(
+        field_name='tags__slug', to_field_name='slug',
+        queryset=Tag.objects.all(), method='filter_all_tags')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'is_favorited', 'is_in_shopping_cart', 'tags']
+        fields = ['author', 'is_favorited', 'is_in_shopping_cart', 'tags',
+                  'all_tags']
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты с любой из меток (по маске меток, без JOIN)."""
+        if not value:
+            return queryset
+        return queryset.alias(
+            any_tags=F('tags_mask').bitand(sum(tag.mask for tag in value))
+        ).filter(any_tags__gt=0)
+
+    def filter_all_tags(self, queryset, name, value):
+        """Рецепты со всеми метками (по маске меток, без JOIN)."""
+        if not value:
+            return queryset
+        mask = sum(tag.mask for tag in value)
+        return queryset.alias(
+            all_tags=F('tags_mask').bitand(mask)
+        ).filter(all_tags=mask)
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -0,0 +1,216 @@
+"""Сброс локальных кэшей процессов при изменении данных.
+
+Кэши в памяти процесса (токены в api.authentication, сжатые ответы в
+кэше Django по умолчанию, он тоже локальный) в других воркерах и на
+других серверах устаревают после изменения рецепта, метки,
+ингредиента или пользователя. Сигналы записывают события
+InvalidationEvent в той же транзакции, что и изменение, а каждый
+процесс читает новые события и сбрасывает свои кэши: на PostgreSQL
+поток процесса ждет уведомления LISTEN/NOTIFY, на SQLite события
+читаются в начале запроса не чаще INVALIDATION_POLL_INTERVAL.
+
+Для каждого объекта процесс запоминает номер последнего примененного
+события (get_events_version) и отправляет сигнал invalidation_received
+с ключами объектов. Номер события общий для всех процессов, поэтому в
+общем кэше процессы с одной версией применили одни и те же события, а
+отстающий процесс использует другие ключи. Задержка от записи события
+до его применения сохраняется в CacheConsumer и выводится командой
+invalidation_status.
+"""
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    DatabaseError,
+    connection,
+    connections
+)
+from django.db.models import Max
+from django.dispatch import Signal
+from django.utils import timezone
+
+from api.constants import (
+    INVALIDATION_BATCH_SIZE,
+    INVALIDATION_CHANNEL,
+    INVALIDATION_EVENT_TTL,
+    INVALIDATION_LISTEN_TIMEOUT,
+    INVALIDATION_POLL_INTERVAL,
+    INVALIDATION_REPORT_INTERVAL
+)
+from api.models import CacheConsumer, InvalidationEvent
+
+logger = logging.getLogger(__name__)
+
+# Отправляется в каждом процессе с аргументами topic и keys.
+invalidation_received = Signal()
+
+# Номер последнего примененного события по объектам.
+versions = {}
+
+
+def get_events_version(*topics):
+    """Версия объектов: номера последних примененных событий о них."""
+    return tuple(versions.get(topic, 0) for topic in topics)
+
+
+def publish(topic, keys):
+    """Записывает события об изменении объектов в текущей транзакции."""
+    keys = [str(key) for key in keys]
+    if not keys:
+        return
+    InvalidationEvent.objects.bulk_create(
+        InvalidationEvent(topic=topic, key=key) for key in keys)
+    if connection.vendor == 'postgresql':
+        # Уведомление доставляется после фиксации транзакции.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)', [INVALIDATION_CHANNEL, ''])
+
+
+class Consumer:
+    """Читает события сброса кэша в текущем процессе."""
+
+    def __init__(self):
+        self.pid = None
+        self.lock = threading.Lock()
+        self.listening = False
+
+    def ensure_started(self):
+        """Начинает чтение с текущего события, в том числе после fork."""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            # Кэши нового процесса пусты, прежние события не нужны.
+            self.last_seq = InvalidationEvent.objects.aggregate(
+                seq=Max('seq'))['seq'] or 0
+            versions.clear()
+            versions.update(InvalidationEvent.objects.filter(
+                seq__lte=self.last_seq).order_by().values(
+                    'topic').annotate(seq=Max('seq')).values_list(
+                        'topic', 'seq'))
+            self.name = f'{socket.gethostname()}:{os.getpid()}'
+            self.lag = 0
+            self.next_poll = 0
+            self.next_report = 0
+            self.next_cleanup = time.monotonic() + INVALIDATION_EVENT_TTL
+            self.listening = False
+            self.pid = os.getpid()
+        if connection.vendor == 'postgresql':
+            threading.Thread(target=self.listen, daemon=True).start()
+
+    def poll_if_due(self):
+        """Читает события, если их не ждет поток LISTEN."""
+        try:
+            self.ensure_started()
+            now = time.monotonic()
+            if self.listening or now < self.next_poll:
+                return
+            self.next_poll = now + INVALIDATION_POLL_INTERVAL
+            self.poll(blocking=False)
+        except DatabaseError as error:
+            # Непрочитанные события применятся при следующем опросе.
+            logger.warning('Чтение событий сброса кэша: %s', error)
+
+    def poll(self, blocking=True):
+        """Применяет новые события, возвращает их количество."""
+        if not self.lock.acquire(blocking):
+            return 0
+        try:
+            events = list(InvalidationEvent.objects.filter(
+                seq__gt=self.last_seq).order_by('seq')[
+                    :INVALIDATION_BATCH_SIZE])
+            if events:
+                self.apply(events)
+            self.report()
+            return len(events)
+        finally:
+            self.lock.release()
+
+    def apply(self, events):
+        keys = {}
+        for event in events:
+            keys.setdefault(event.topic, []).append(event.key)
+            versions[event.topic] = event.seq
+        for topic, topic_keys in keys.items():
+            invalidation_received.send(
+                sender=InvalidationEvent, topic=topic, keys=topic_keys)
+        self.last_seq = events[-1].seq
+        self.lag = max(self.lag, (
+            timezone.now() - events[0].created).total_seconds())
+
+    def report(self):
+        """Сохраняет позицию и наибольшую задержку за период."""
+        now = time.monotonic()
+        if now < self.next_report:
+            return
+        self.next_report = now + INVALIDATION_REPORT_INTERVAL
+        try:
+            CacheConsumer.objects.update_or_create(
+                name=self.name,
+                defaults={'last_seq': self.last_seq, 'lag': self.lag})
+            self.lag = 0
+            if now >= self.next_cleanup:
+                self.next_cleanup = now + INVALIDATION_EVENT_TTL
+                delete_old_events()
+        except DatabaseError as error:
+            # Занятая база не должна мешать запросу: задержка
+            # запишется в следующий период.
+            logger.warning('Запись задержки сброса кэша: %s', error)
+
+    def listen(self):
+        """Ждет уведомлений PostgreSQL и читает события."""
+        wrapper = connections[DEFAULT_DB_ALIAS]
+        while True:
+            listener = None
+            try:
+                listener = wrapper.get_new_connection(
+                    wrapper.get_connection_params())
+                listener.autocommit = True
+                with listener.cursor() as cursor:
+                    cursor.execute(f'LISTEN {INVALIDATION_CHANNEL}')
+                self.listening = True
+                while True:
+                    # Без уведомлений события тоже читаются, в том числе
+                    # пропущенные до LISTEN.
+                    self.poll()
+                    select.select(
+                        [listener], [], [], INVALIDATION_LISTEN_TIMEOUT)
+                    listener.poll()
+                    listener.notifies.clear()
+            except Exception as error:
+                logger.warning('Ожидание событий сброса кэша: %s', error)
+                self.listening = False
+                connection.close()
+                time.sleep(INVALIDATION_POLL_INTERVAL)
+            finally:
+                if listener is not None:
+                    listener.close()
+
+
+consumer = Consumer()
+
+
+def delete_old_events():
+    """Удаляет старые события и записи завершенных процессов."""
+    threshold = timezone.now() - timedelta(seconds=INVALIDATION_EVENT_TTL)
+    InvalidationEvent.objects.filter(created__lt=threshold).delete()
+    CacheConsumer.objects.filter(updated__lt=threshold).delete()
+
+
+class InvalidationMiddleware:
+    """Применяет события сброса кэша до обработки запроса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        consumer.poll_if_due()
+        return self.get_response(request)
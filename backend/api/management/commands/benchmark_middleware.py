@@ -0,0 +1,52 @@
+"""Модуль для сравнения накладных расходов промежуточных слоев."""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.utils.module_loading import import_string
+
+from api.benchmark import generate_dataset, rollback, timeit
+from api.middleware import LeanRouteMixin
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Класс для сравнения полного и сокращенного набора слоев."""
+
+    help = ('Измеряет время запросов к списку меток и короткой ссылке с '
+            'стандартными промежуточными слоями и со слоями api.middleware, '
+            'пропускающими API. Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        full_stack = []
+        for path in settings.MIDDLEWARE:
+            middleware = import_string(path)
+            if issubclass(middleware, LeanRouteMixin):
+                # Стандартный слой, подклассом которого является слой.
+                middleware = middleware.__bases__[-1]
+                path = f'{middleware.__module__}.{middleware.__qualname__}'
+            full_stack.append(path)
+        with rollback():
+            generate_dataset(10, 50, 10)
+            recipe = Recipe.objects.first()
+            urls = ('/api/tags/', f'/s/{recipe.short_code}/')
+            results = {}
+            for name, middleware in (('полный набор', full_stack),
+                                     ('по адресу', settings.MIDDLEWARE)):
+                with override_settings(MIDDLEWARE=middleware):
+                    # Cookie сессии, как у браузера после входа в админку.
+                    client = Client(SERVER_NAME='localhost')
+                    client.cookies[settings.SESSION_COOKIE_NAME] = 'x' * 32
+                    for url in urls:
+                        client.get(url)
+                        results[url, name] = timeit(
+                            lambda: client.get(url), options['repeat'])
+        for url in urls:
+            full, lean = results[url, 'полный набор'], results[
+                url, 'по адресу']
+            self.stdout.write(
+                f'GET {url}: полный набор {full:.3f} мс, по адресу '
+                f'{lean:.3f} мс, экономия {full - lean:.3f} мс на запрос')
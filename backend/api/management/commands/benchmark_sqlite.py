@@ -0,0 +1,123 @@
+"""Модуль для сравнения конкурентной нагрузки на SQLite."""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from rest_framework.test import APIClient
+
+from api.benchmark import generate_dataset
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Класс для сравнения SQLite с настройками по умолчанию и профилем."""
+
+    help = ('Создает две временные базы SQLite, с настройками по умолчанию '
+            'и с профилем SQLITE_PRAGMAS, и запускает в отдельных '
+            'процессах читателей ленты рецептов и писателей избранного. '
+            'Выводит число запросов в секунду и ошибок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--worker', choices=('prepare', 'read', 'write'),
+            help='Служебный режим процесса нагрузки.')
+        parser.add_argument('--index', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        if options['worker']:
+            return self.run_worker(options)
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for tuning in (False, True):
+                env = {
+                    **os.environ,
+                    'SQLITE_PATH': os.path.join(
+                        directory, f'benchmark-{tuning}.sqlite3'),
+                    'SQLITE_TUNING': str(tuning),
+                }
+                self.manage(env, 'migrate', '--verbosity', '0')
+                self.manage(env, 'benchmark_sqlite', '--worker', 'prepare',
+                            '--users', str(options['users']),
+                            '--recipes', str(options['recipes']))
+                results.append((
+                    'профиль SQLITE_PRAGMAS' if tuning else 'по умолчанию',
+                    self.run_load(env, options)))
+        for name, (reads, writes, errors) in results:
+            self.stdout.write(
+                f'SQLite {name}: чтение {reads:.1f} запр/с, '
+                f'запись {writes:.1f} запр/с, ошибок {errors}')
+
+    def manage(self, env, *args, **kwargs):
+        command = [sys.executable, sys.argv[0], *args]
+        return subprocess.run(command, env=env, check=True, **kwargs)
+
+    def run_load(self, env, options):
+        """Запускает читателей и писателей и суммирует их результаты."""
+        processes = [
+            subprocess.Popen(
+                [sys.executable, sys.argv[0], 'benchmark_sqlite',
+                 '--worker', worker, '--index', str(index),
+                 '--duration', str(options['duration'])],
+                env=env, stdout=subprocess.PIPE, text=True)
+            for worker, count in (('read', options['readers']),
+                                  ('write', options['writers']))
+            for index in range(count)
+        ]
+        totals = {'read': 0, 'write': 0, 'errors': 0}
+        for process in processes:
+            output, _ = process.communicate()
+            result = json.loads(output.strip().splitlines()[-1])
+            totals[result['worker']] += result['requests']
+            totals['errors'] += result['errors']
+        duration = options['duration']
+        return (totals['read'] / duration, totals['write'] / duration,
+                totals['errors'])
+
+    def run_worker(self, options):
+        if options['worker'] == 'prepare':
+            generate_dataset(options['users'], options['recipes'], 200)
+            return
+        client = APIClient()
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        if options['worker'] == 'write':
+            client.force_authenticate(
+                User.objects.order_by('pk')[options['index']])
+        requests = errors = 0
+        deadline = time.monotonic() + options['duration']
+        while time.monotonic() < deadline:
+            try:
+                if options['worker'] == 'read':
+                    response = client.get(
+                        '/api/recipes/', {
+                            'limit': 10,
+                            'offset': random.randrange(len(recipe_ids))},
+                        SERVER_NAME='localhost')
+                else:
+                    url = (f'/api/recipes/{random.choice(recipe_ids)}/'
+                           'favorite/')
+                    response = client.post(url, SERVER_NAME='localhost')
+                    if response.status_code == 201:
+                        response = client.delete(
+                            url, SERVER_NAME='localhost')
+                errors += response.status_code >= 500
+            except OperationalError:
+                errors += 1
+            requests += 1
+        self.stdout.write(json.dumps({
+            'worker': options['worker'], 'requests': requests,
+            'errors': errors}))
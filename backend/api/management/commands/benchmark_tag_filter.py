@@ -0,0 +1,50 @@
+"""Модуль для сравнения фильтрации ленты по меткам."""
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from rest_framework.test import APIClient
+
+from api.benchmark import generate_dataset, rollback, timeit
+from recipes.models import Recipe, Tag
+
+
+class Command(BaseCommand):
+    """Класс для сравнения фильтра по маске меток с фильтром через JOIN."""
+
+    help = ('Сравнивает время страницы ленты с фильтром по меткам через '
+            'M2M JOIN и через маску меток. Данные откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=50000)
+        parser.add_argument('--tags', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        repeat = options['repeat']
+        with rollback():
+            generate_dataset(options['users'], options['recipes'], 100,
+                             tags_count=options['tags'])
+            tags = list(Tag.objects.order_by('-id')[:2])
+            mask = sum(tag.mask for tag in tags)
+
+            def join_page():
+                list(Recipe.objects.filter(tags__in=tags).distinct()[:10])
+
+            def mask_page():
+                list(Recipe.objects.alias(
+                    any_tags=F('tags_mask').bitand(mask)
+                ).filter(any_tags__gt=0)[:10])
+
+            client = APIClient()
+            url = '/api/recipes/?' + '&'.join(
+                f'tags={tag.slug}' for tag in tags)
+            results = (
+                ('Страница, M2M JOIN + DISTINCT', timeit(join_page, repeat)),
+                ('Страница, маска меток', timeit(mask_page, repeat)),
+                ('GET ' + url, timeit(
+                    lambda: client.get(url, SERVER_NAME='localhost'),
+                    repeat)),
+            )
+        for name, duration in results:
+            self.stdout.write(f'{name}: {duration:.2f} мс')
@@ -0,0 +1,119 @@
+"""Модуль для проверки одновременных переключений избранного и корзины."""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.benchmark import generate_dataset
+from recipes.models import FavoriteRecipe, Recipe, ShoppingcartRecipe
+
+User = get_user_model()
+
+TOGGLES = (('favorite', FavoriteRecipe), ('shopping_cart', ShoppingcartRecipe))
+
+
+class Command(BaseCommand):
+    """Класс для нагрузки параллельными переключениями с Idempotency-Key."""
+
+    help = ('Создает временную базу SQLite и отправляет из нескольких '
+            'потоков сотни одновременных добавлений и удалений избранного '
+            'и корзины для нескольких пользователей и рецептов. Каждый '
+            'запрос повторяется с тем же Idempotency-Key. Выводит коды '
+            'ответов, число ошибок 5xx и несовпадений повторов и '
+            'проверяет, что в базе нет дублей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--recipes', type=int, default=3)
+        parser.add_argument(
+            '--worker', action='store_true',
+            help='Служебный режим процесса нагрузки.')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        if options['worker']:
+            return self.run_worker(options)
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'SQLITE_PATH': os.path.join(
+                directory, 'benchmark.sqlite3')}
+            subprocess.run([sys.executable, sys.argv[0], 'migrate',
+                            '--verbosity', '0'], env=env, check=True)
+            output = subprocess.run(
+                [sys.executable, sys.argv[0], 'benchmark_toggles',
+                 '--worker', *(f'--{name}={options[name]}' for name in (
+                     'requests', 'threads', 'users', 'recipes'))],
+                env=env, check=True, stdout=subprocess.PIPE, text=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        self.stdout.write(
+            f'Запросов: {result["requests"]} за {result["duration"]:.2f} с, '
+            f'коды ответов: {result["statuses"]}')
+        failed = (result['server_errors'] or result['replay_mismatches']
+                  or result['duplicates'])
+        message = (f'Ошибок 5xx: {result["server_errors"]}, несовпадений '
+                   f'повторов: {result["replay_mismatches"]}, дублей в '
+                   f'базе: {result["duplicates"]}')
+        self.stdout.write(
+            self.style.ERROR(message) if failed
+            else self.style.SUCCESS(message))
+
+    def run_worker(self, options):
+        generate_dataset(options['users'], 50, 20)
+        tokens = [
+            Token.objects.create(user=user).key
+            for user in User.objects.order_by('pk')[:options['users']]
+        ]
+        recipe_ids = list(Recipe.objects.order_by('pk').values_list(
+            'pk', flat=True)[:options['recipes']])
+        connection.close()
+
+        def toggle(_):
+            client = APIClient()
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {random.choice(tokens)}')
+            name, _ = random.choice(TOGGLES)
+            url = f'/api/recipes/{random.choice(recipe_ids)}/{name}/'
+            method = random.choice((client.post, client.delete))
+            key = uuid.uuid4().hex
+            try:
+                first, replay = (
+                    method(url, SERVER_NAME='localhost',
+                           HTTP_IDEMPOTENCY_KEY=key)
+                    for _ in range(2))
+                return first.status_code, (
+                    first.status_code != replay.status_code
+                    or first.content != replay.content)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['threads']) as executor:
+            results = list(executor.map(toggle, range(options['requests'])))
+        duration = time.perf_counter() - start
+        statuses = Counter(status_code for status_code, _ in results)
+        duplicates = sum(
+            model.objects.values('user', 'recipe').count()
+            - model.objects.values('user', 'recipe').distinct().count()
+            for _, model in TOGGLES)
+        self.stdout.write(json.dumps({
+            'requests': len(results) * 2,
+            'duration': duration,
+            'statuses': dict(sorted(statuses.items())),
+            'server_errors': sum(
+                count for code, count in statuses.items() if code >= 500),
+            'replay_mismatches': sum(mismatch for _, mismatch in results),
+            'duplicates': duplicates,
+        }))
@@ -0,0 +1,31 @@
+"""Модуль для проверки документов рецептов."""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.read_model import check_documents
+
+
+class Command(BaseCommand):
+    """Класс для проверки документов рецептов."""
+
+    help = ('Сравнивает сохраненные документы рецептов с собранными '
+            'заново и выводит рецепты с расхождениями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать документы с расхождениями.')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        broken = check_documents(fix=options['fix'])
+        if not broken:
+            self.stdout.write(self.style.SUCCESS(
+                'Все документы рецептов актуальны'))
+            return
+        message = (f'Документов с расхождениями: {len(broken)}, id: '
+                   f'{", ".join(map(str, broken[:20]))}')
+        if options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f'{message}. Документы пересобраны'))
+            return
+        raise CommandError(message)
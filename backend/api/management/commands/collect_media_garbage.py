@@ -0,0 +1,44 @@
+"""Модуль для удаления файлов изображений без ссылок."""
+from django.core.management.base import BaseCommand
+
+from api.constants import MEDIA_GC_BATCH_SIZE
+from api.media import collect_garbage, recount_references
+from api.uploads import delete_expired_uploads
+
+
+class Command(BaseCommand):
+    """Класс для сборки мусора в хранилище изображений."""
+
+    help = ('Обходит каталоги изображений пачками и удаляет файлы, на '
+            'которые не ссылается ни один рецепт или пользователь. '
+            'Продолжает обход с места прошлой остановки. Удаляет '
+            'загрузки старше UPLOAD_TTL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batches', type=int, default=0,
+            help='Количество пачек за запуск (0 - до конца обхода).')
+        parser.add_argument(
+            '--batch-size', type=int, default=MEDIA_GC_BATCH_SIZE)
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Пересчитать ссылки по таблицам перед обходом.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только вывести количество файлов без ссылок.')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        if options['recount']:
+            fixed = recount_references()
+            self.stdout.write(f'Исправлено счетчиков ссылок: {fixed}')
+        if not options['dry_run']:
+            self.stdout.write(
+                f'Удалено загрузок: {delete_expired_uploads()}')
+        checked, deleted = collect_garbage(
+            options['batches'], options['batch_size'], options['dry_run'],
+            log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {checked}, '
+            f'{"без ссылок" if options["dry_run"] else "удалено"}: '
+            f'{deleted}'))
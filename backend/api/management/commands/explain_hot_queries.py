@@ -0,0 +1,123 @@
+"""Модуль для анализа планов запросов основных эндпоинтов."""
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.benchmark import generate_dataset, rollback
+from recipes.models import Ingredient, Recipe, Tag
+
+# Маленькие справочники, для которых полный проход дешевле индекса.
+DEFAULT_ALLOWED_TABLES = ('recipes_tag',)
+
+
+class Command(BaseCommand):
+    """Класс для EXPLAIN запросов основных эндпоинтов."""
+
+    help = ('Генерирует большой набор данных, выполняет запросы основных '
+            'эндпоинтов и ищет последовательные сканирования таблиц. '
+            'Все данные откатываются после анализа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=50000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument(
+            '--allow-table', action='append', dest='allowed_tables',
+            default=list(DEFAULT_ALLOWED_TABLES),
+            help='Таблица, полный проход по которой допустим.')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        self.allowed_tables = set(options['allowed_tables'])
+        self.tables = set(connection.introspection.table_names())
+        self.flagged = 0
+        with rollback():
+            self.stdout.write('Генерация данных...')
+            user = generate_dataset(
+                options['users'], options['recipes'],
+                options['ingredients'])
+            self.analyze()
+            for url in self.get_urls(user):
+                self.explain_url(user, url)
+        if self.flagged:
+            self.stdout.write(self.style.ERROR(
+                f'Найдено последовательных сканирований: {self.flagged}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Последовательных сканирований не найдено'))
+
+    def analyze(self):
+        """Обновляет статистику планировщика."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def get_urls(self, user):
+        """Запросы основных эндпоинтов."""
+        recipe = user.recipes.first() or Recipe.objects.first()
+        tag = Tag.objects.last()
+        ingredient = Ingredient.objects.last()
+        following = user.following.first().following
+        return (
+            '/api/recipes/',
+            '/api/recipes/?limit=10&offset=1000',
+            f'/api/recipes/?author={following.id}',
+            f'/api/recipes/?tags={tag.slug}',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+            f'/api/recipes/{recipe.id}/',
+            '/api/recipes/download_shopping_cart/',
+            '/api/tags/',
+            f'/api/ingredients/?name={ingredient.name[:8]}',
+            '/api/users/',
+            f'/api/users/{following.id}/',
+            '/api/users/subscriptions/?recipes_limit=3',
+            f'/s/{recipe.short_code}/',
+        )
+
+    def explain_url(self, user, url):
+        """Выполняет запрос и выводит планы всех его SQL-запросов."""
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, SERVER_NAME='localhost')
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{url} -> {response.status_code}, '
+            f'запросов: {len(context.captured_queries)}'))
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            scans = self.find_seq_scans(self.explain(sql))
+            if scans:
+                self.flagged += len(scans)
+                self.stdout.write(self.style.WARNING(
+                    f'  SEQ SCAN {", ".join(scans)}: {sql}'))
+
+    def explain(self, sql):
+        """Возвращает строки плана запроса."""
+        prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+                  else 'EXPLAIN ')
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def find_seq_scans(self, plan):
+        """Ищет в плане полные проходы по таблицам."""
+        scans = []
+        for line in plan:
+            line = line.strip()
+            if connection.vendor == 'sqlite':
+                if not line.startswith('SCAN ') or 'USING' in line:
+                    continue
+                words = line.split()
+                table = words[2] if words[1] == 'TABLE' else words[1]
+            else:
+                if 'Seq Scan on ' not in line:
+                    continue
+                table = line.split('Seq Scan on ')[1].split()[0]
+            # Подзапросы и временные b-tree не являются таблицами.
+            if table in self.tables and table not in self.allowed_tables:
+                scans.append(table)
+        return scans
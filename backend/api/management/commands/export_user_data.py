@@ -0,0 +1,30 @@
+"""Модуль для выгрузки данных пользователя."""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import generate_archive
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Класс для выгрузки данных пользователя в ZIP-архив."""
+
+    help = ('Выгружает рецепты с изображениями, избранное, список покупок '
+            'и подписки пользователя в ZIP-архив.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email пользователя.')
+        parser.add_argument('output', help='Путь к файлу архива.')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError('Пользователь не найден')
+        with open(options['output'], 'wb') as file:
+            for chunk in generate_archive(user):
+                file.write(chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные пользователя выгружены в {options["output"]}'))
@@ -0,0 +1,46 @@
+"""Модуль для вывода задержки сброса локальных кэшей процессов."""
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from api.models import CacheConsumer, InvalidationEvent
+
+
+class Command(BaseCommand):
+    """Класс для вывода отставания процессов от событий сброса кэша."""
+
+    help = ('Выводит для каждого процесса с локальным кэшем последнее '
+            'прочитанное событие сброса кэша, отставание в событиях и '
+            'наибольшую задержку применения события за последний период. '
+            'С --prometheus выводит метрики в текстовом формате '
+            'Prometheus.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prometheus', action='store_true')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        head = InvalidationEvent.objects.aggregate(
+            seq=Max('seq'))['seq'] or 0
+        consumers = CacheConsumer.objects.all()
+        if options['prometheus']:
+            self.stdout.write(
+                '# TYPE cache_invalidation_lag_seconds gauge')
+            for consumer in consumers:
+                self.stdout.write(
+                    'cache_invalidation_lag_seconds'
+                    f'{{process="{consumer.name}"}} {consumer.lag}')
+            self.stdout.write(
+                '# TYPE cache_invalidation_behind_events gauge')
+            for consumer in consumers:
+                self.stdout.write(
+                    'cache_invalidation_behind_events'
+                    f'{{process="{consumer.name}"}} '
+                    f'{head - consumer.last_seq}')
+            return
+        self.stdout.write(f'Последнее событие: {head}')
+        for consumer in consumers:
+            self.stdout.write(
+                f'{consumer.name}: событие {consumer.last_seq}, '
+                f'отставание {head - consumer.last_seq}, '
+                f'задержка {consumer.lag:.3f} с, '
+                f'обновлено {consumer.updated:%Y-%m-%d %H:%M:%S}')
@@ -5,7 +5,7 @@ import os
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
-from recipes.models import Ingredient, Tag
+from recipes.models import CatalogChange, Ingredient, Tag
 
 
 class Command(BaseCommand):
@@ -17,6 +17,9 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('Пошла загрузка...'))
         self.import_ingredients(data_dir)
         self.import_tags(data_dir)
+        # bulk_create не вызывает сигналы, изменения пишутся отдельно.
+        CatalogChange.record_untracked(Ingredient)
+        CatalogChange.record_untracked(Tag)
         self.stdout.write(self.style.SUCCESS('Загрузка прошла успешно!'))
 
     def import_ingredients(self, data_dir):
@@ -43,12 +46,17 @@ class Command(BaseCommand):
         """Импортирует метки."""
         tags_file = os.path.join(data_dir, 'tags.csv')
         tags_to_create = []
+        existing_slugs = set(Tag.objects.values_list('slug', flat=True))
+        free_bits = Tag.free_bits()
         with open(tags_file, mode='r', encoding='utf-8') as file:
             reader = csv.DictReader(file)
             for row in reader:
+                if row['slug'] in existing_slugs:
+                    continue
                 tags_data = {
                     'name': row['name'],
-                    'slug': row['slug']
+                    'slug': row['slug'],
+                    'bit': next(free_bits)
                 }
                 tags_to_create.append(Tag(**tags_data))
         try:
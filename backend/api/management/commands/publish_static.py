@@ -0,0 +1,53 @@
+"""Модуль для публикации анонимных ответов ленты и рецептов в файлы."""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.constants import PUBLISH_POLL_INTERVAL
+from api.publisher import clear, publish_all, publish_pending
+
+
+class Command(BaseCommand):
+    """Класс для полной публикации ответов в PUBLISH_ROOT."""
+
+    help = ('Записывает в PUBLISH_ROOT ответы первых страниц общей ленты '
+            'и лент меток и детали всех рецептов для отдачи nginx, '
+            'удаляет файлы удаленных рецептов и меток. С --loop затем '
+            'перерисовывает файлы рецептов, измененных при включенном '
+            'STATIC_PUBLISHING.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить опубликованные файлы без новой публикации.')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='После публикации постоянно обрабатывать очередь '
+                 'измененных рецептов.')
+        parser.add_argument(
+            '--interval', type=float, default=PUBLISH_POLL_INTERVAL,
+            help='Период проверки очереди в режиме --loop, с.')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        if options['clear']:
+            clear()
+            self.stdout.write(self.style.SUCCESS('Файлы удалены.'))
+            return
+        if options['loop'] and not settings.STATIC_PUBLISHING:
+            self.stdout.write(self.style.WARNING(
+                'STATIC_PUBLISHING выключен, очередь не заполняется.'))
+            return
+        recipes, pages = publish_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Опубликовано рецептов: {recipes}, страниц лент: {pages}'))
+        while options['loop']:
+            try:
+                done = publish_pending()
+            except Exception as error:
+                # Задачи вернулись в очередь и повторятся.
+                self.stderr.write(f'Ошибка публикации: {error}')
+                done = 0
+            if not done:
+                time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+"""Модуль для фонового удаления пользователей и рецептов."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.constants import PURGE_POLL_INTERVAL
+from api.purge import run_pending
+
+
+class Command(BaseCommand):
+    """Класс для удаления данных помеченных на удаление объектов."""
+
+    help = ('Удаляет пачками связанные записи и файлы пользователей и '
+            'рецептов, помеченных на удаление.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Проверять очередь удаления постоянно.')
+        parser.add_argument(
+            '--interval', type=float, default=PURGE_POLL_INTERVAL,
+            help='Период проверки очереди в режиме --loop, с.')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        while True:
+            done = run_pending(log=lambda message: self.stdout.write(message))
+            if not options['loop']:
+                break
+            if not done:
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Очередь удаления обработана'))
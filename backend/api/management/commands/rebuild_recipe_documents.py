@@ -0,0 +1,45 @@
+"""Модуль для полной пересборки документов рецептов."""
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+
+from api.models import RecipeDocument
+from api.read_model import rebuild_range
+from recipes.models import Recipe
+
+RANGE_SIZE = 2000  # Количество id рецептов в задании одного процесса
+
+
+class Command(BaseCommand):
+    """Класс для полной пересборки документов рецептов."""
+
+    help = ('Пересобирает документы всех рецептов, распределяя диапазоны '
+            'id между процессами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        bounds = Recipe.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        RecipeDocument.objects.exclude(
+            recipe_id__in=Recipe.objects.values('pk')).delete()
+        if bounds['first'] is None:
+            self.stdout.write(self.style.SUCCESS('Рецептов нет'))
+            return
+        ranges = [
+            (start, min(start + RANGE_SIZE - 1, bounds['last']))
+            for start in range(bounds['first'], bounds['last'] + 1,
+                               RANGE_SIZE)
+        ]
+        # Дочерние процессы не должны разделять соединение родителя.
+        connections.close_all()
+        total = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for count in pool.map(rebuild_range, *zip(*ranges)):
+                total += count
+                self.stdout.write(f'Пересобрано документов: {total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Документы пересобраны для {total} рецептов'))
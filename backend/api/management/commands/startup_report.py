@@ -0,0 +1,56 @@
+"""Модуль для отчета о времени запуска и памяти воркеров."""
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Класс для сравнения запуска воркеров с preload и без него."""
+
+    help = ('Запускает воркеры так, как это делает gunicorn без preload '
+            '(каждый загружает приложение) и с preload, прогревом и '
+            'gc.freeze (воркеры создаются fork из мастера), выполняет '
+            'запросы и выводит время до первого ответа и память каждого '
+            'воркера. Требует Linux (/proc/self/smaps_rollup).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=3)
+        parser.add_argument('--requests', type=int, default=30)
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        workers, requests = options['workers'], options['requests']
+        plain = []
+        for _ in range(workers):
+            plain += self.probe('plain', 1, requests)
+        self.report('Без preload', plain)
+        self.report('Preload + gc.freeze', self.probe(
+            'preload', workers, requests))
+
+    def probe(self, mode, workers, requests):
+        output = subprocess.run(
+            [sys.executable, '-c',
+             'from api.startup_probe import main; main()',
+             mode, str(workers), str(requests)],
+            cwd=settings.BASE_DIR, check=True, capture_output=True,
+            text=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def report(self, name, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        if 'preload' in results[0]:
+            self.stdout.write(
+                f'  загрузка и прогрев в мастере: '
+                f'{results[0]["preload"] * 1000:.0f} мс')
+        for index, result in enumerate(results, 1):
+            self.stdout.write(
+                f'  воркер {index}: первый ответ через '
+                f'{result["first_response"] * 1000:.0f} мс, '
+                f'RSS {result["rss"]:.1f} МиБ, PSS {result["pss"]:.1f} МиБ, '
+                f'собственная {result["uss"]:.1f} МиБ')
+        self.stdout.write(
+            f'  собственная память всех воркеров: '
+            f'{sum(result["uss"] for result in results):.1f} МиБ')
@@ -0,0 +1,191 @@
+"""Учет ссылок на файлы изображений и сборка мусора.
+
+Изображения рецептов и аватары хранятся в api.storage по хешу
+содержимого, поэтому один файл может принадлежать нескольким записям.
+Количество ссылок хранится в MediaFile и меняется сигналами при
+сохранении и удалении записей. Файл без ссылок не удаляется сразу:
+collect_garbage обходит каталоги изображений пачками и удаляет файлы без
+ссылок старше MEDIA_GC_GRACE_PERIOD, перед удалением проверяя ссылки и
+в самих таблицах. Позиция обхода сохраняется, поэтому каждый запуск
+продолжает с места остановки.
+"""
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.constants import (
+    MEDIA_GC_BATCH_SIZE,
+    MEDIA_GC_CURSOR,
+    MEDIA_GC_GRACE_PERIOD
+)
+from api.export import chunked
+from api.models import MediaFile
+from api.storage import media_storage
+from recipes.models import Recipe
+
+User = get_user_model()
+
+# Поля с файлами в хранилище по содержимому.
+MEDIA_FIELDS = ((Recipe, 'image'), (User, 'avatar'))
+
+
+def file_name(value):
+    """Имя файла из значения поля (строки или FieldFile)."""
+    return getattr(value, 'name', value) or ''
+
+
+def acquire(name):
+    """Добавляет ссылку на файл."""
+    if not name:
+        return
+    updated = MediaFile.objects.filter(name=name).update(
+        references=F('references') + 1, updated=timezone.now())
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(name=name, references=1)
+    except IntegrityError:
+        # Запись создана параллельно.
+        acquire(name)
+
+
+def release(name):
+    """Убирает ссылку на файл, сам файл удаляет collect_garbage."""
+    if name:
+        MediaFile.objects.filter(name=name, references__gt=0).update(
+            references=F('references') - 1, updated=timezone.now())
+
+
+def count_references():
+    """Количество ссылок на файлы по таблицам, {имя: количество}."""
+    counts = Counter()
+    for model, field in MEDIA_FIELDS:
+        names = model._base_manager.exclude(
+            **{f'{field}__isnull': True}).exclude(**{field: ''}).values_list(
+                field, flat=True)
+        counts.update(names.iterator(chunk_size=MEDIA_GC_BATCH_SIZE))
+    return counts
+
+
+def recount_references():
+    """Пересчитывает ссылки, если они разошлись с таблицами.
+
+    Ссылки не учитываются при массовых операциях (bulk_create, update),
+    которые не вызывают сигналы. Возвращает число исправленных файлов.
+    """
+    counts = count_references()
+    fixed = 0
+    with transaction.atomic():
+        for media_file in MediaFile.objects.select_for_update().iterator():
+            references = counts.pop(media_file.name, 0)
+            if media_file.references != references:
+                media_file.references = references
+                media_file.save(update_fields=('references', 'updated'))
+                fixed += 1
+        MediaFile.objects.bulk_create(
+            MediaFile(name=name, references=references)
+            for name, references in counts.items())
+    return fixed + len(counts)
+
+
+def walk_directory(directory, after):
+    """Файлы каталога в порядке имен, большие after.
+
+    Каталоги сравниваются с завершающим /, поэтому порядок обхода
+    совпадает с порядком полных имен и позицию можно хранить одной
+    строкой. Каталоги, целиком пройденные раньше, не читаются.
+    """
+    try:
+        entries = {
+            entry.name + '/' if entry.is_dir() else entry.name: entry
+            for entry in os.scandir(media_storage.path(directory))
+        }
+    except FileNotFoundError:
+        return
+    for key in sorted(entries):
+        name = f'{directory}/{key}'
+        if not key.endswith('/'):
+            if name > after:
+                yield name
+        elif name > after or after.startswith(name):
+            yield from walk_directory(name.rstrip('/'), after)
+
+
+def walk_files(after=''):
+    """Файлы каталогов изображений по порядку имен после after."""
+    directories = sorted({
+        model._meta.get_field(field).upload_to.strip('/')
+        for model, field in MEDIA_FIELDS
+    })
+    for directory in directories:
+        yield from walk_directory(directory, after)
+
+
+def read_cursor():
+    try:
+        with open(media_storage.path(MEDIA_GC_CURSOR)) as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return ''
+
+
+def write_cursor(name):
+    with open(media_storage.path(MEDIA_GC_CURSOR), 'w') as file:
+        file.write(name)
+
+
+def find_orphans(names, threshold):
+    """Файлы из names без ссылок, не менявшиеся с момента threshold."""
+    referenced = set(MediaFile.objects.filter(name__in=names).filter(
+        references__gt=0).values_list('name', flat=True))
+    referenced |= set(MediaFile.objects.filter(
+        name__in=names, updated__gt=threshold).values_list('name', flat=True))
+    for model, field in MEDIA_FIELDS:
+        referenced |= set(model._base_manager.filter(**{
+            f'{field}__in': names}).values_list(field, flat=True))
+    orphans = []
+    for name in names:
+        if name in referenced:
+            continue
+        try:
+            modified = media_storage.get_modified_time(name)
+        except FileNotFoundError:
+            continue
+        if modified < threshold:
+            orphans.append(name)
+    return orphans
+
+
+def collect_garbage(batches=None, batch_size=MEDIA_GC_BATCH_SIZE,
+                    dry_run=False, log=None):
+    """Удаляет файлы без ссылок, проверяя не более batches пачек.
+
+    Возвращает (проверено файлов, удалено файлов).
+    """
+    threshold = timezone.now() - timedelta(seconds=MEDIA_GC_GRACE_PERIOD)
+    checked = deleted = 0
+    for number, names in enumerate(
+            chunked(walk_files(read_cursor()), batch_size), 1):
+        orphans = find_orphans(names, threshold)
+        if not dry_run:
+            for name in orphans:
+                media_storage.delete(name)
+            MediaFile.objects.filter(
+                name__in=orphans, references=0).delete()
+            write_cursor(names[-1])
+        checked += len(names)
+        deleted += len(orphans)
+        if log:
+            log(f'Проверено файлов: {checked}, без ссылок: {deleted}')
+        if batches and number >= batches:
+            return checked, deleted
+    if not dry_run:
+        # Обход завершен, следующий запуск начнет сначала.
+        write_cursor('')
+    return checked, deleted
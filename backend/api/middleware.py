@@ -0,0 +1,56 @@
+"""Промежуточные слои, пропускающие запросы к API.
+
+API и короткие ссылки аутентифицируются только токеном, поэтому сессии,
+CSRF, сообщения и защита от встраивания во фрейм для них не нужны:
+SessionMiddleware, например, при наличии cookie читает таблицу сессий.
+Слои ниже - подклассы стандартных, подключенные в MIDDLEWARE вместо них:
+для адресов LEAN_MIDDLEWARE_PREFIXES они сразу передают запрос дальше,
+для админки и остальных адресов работают как стандартные. Загрузку слоев
+и вызов process_view выполняет Django, а проверки админки находят слои
+в MIDDLEWARE.
+"""
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+
+
+def is_lean(request):
+    return request.path_info.startswith(settings.LEAN_MIDDLEWARE_PREFIXES)
+
+
+class LeanRouteMixin:
+    """Пропускает запросы к LEAN_MIDDLEWARE_PREFIXES мимо слоя."""
+
+    def __call__(self, request):
+        if is_lean(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class LeanSessionMiddleware(LeanRouteMixin, SessionMiddleware):
+    pass
+
+
+class LeanCsrfViewMiddleware(LeanRouteMixin, CsrfViewMiddleware):
+
+    def process_view(self, request, callback, callback_args,
+                     callback_kwargs):
+        if is_lean(request):
+            return None
+        return super().process_view(
+            request, callback, callback_args, callback_kwargs)
+
+
+class LeanAuthenticationMiddleware(LeanRouteMixin, AuthenticationMiddleware):
+    pass
+
+
+class LeanMessageMiddleware(LeanRouteMixin, MessageMiddleware):
+    pass
+
+
+class LeanXFrameOptionsMiddleware(LeanRouteMixin, XFrameOptionsMiddleware):
+    pass
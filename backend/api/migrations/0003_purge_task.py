@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_recipe_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user', 'Пользователь'), ('recipe', 'Рецепт')], max_length=16, verbose_name='Объект')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Id объекта')),
+                ('label', models.CharField(max_length=256, verbose_name='Название')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершено'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=16, verbose_name='Статус')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата удаления')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Начало очистки')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Окончание очистки')),
+                ('total', models.PositiveBigIntegerField(default=0, verbose_name='Записей (оценка)')),
+                ('purged', models.PositiveBigIntegerField(default=0, verbose_name='Удалено записей')),
+                ('files_deleted', models.PositiveIntegerField(default=0, verbose_name='Удалено файлов')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+            ],
+            options={
+                'verbose_name': 'задача удаления',
+                'verbose_name_plural': 'Задачи удаления',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
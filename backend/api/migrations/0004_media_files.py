@@ -0,0 +1,44 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:17
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    MediaFile = apps.get_model('api', 'MediaFile')
+    counts = Counter()
+    for app, model, field in (('recipes', 'Recipe', 'image'),
+                              ('users', 'Chef', 'avatar')):
+        names = apps.get_model(app, model)._base_manager.exclude(
+            **{f'{field}__isnull': True}).exclude(**{field: ''}).values_list(
+                field, flat=True)
+        counts.update(names.iterator())
+    MediaFile.objects.bulk_create(
+        MediaFile(name=name, references=references)
+        for name, references in counts.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_purge_task'),
+        ('recipes', '0018_content_storage'),
+        ('users', '0006_content_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Изменено')),
+            ],
+            options={
+                'verbose_name': 'файл',
+                'verbose_name_plural': 'Файлы',
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
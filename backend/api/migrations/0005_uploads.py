@@ -0,0 +1,32 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0004_media_files'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('token', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Токен')),
+                ('size', models.PositiveIntegerField(blank=True, null=True, verbose_name='Размер')),
+                ('received', models.PositiveIntegerField(default=0, verbose_name='Получено')),
+                ('extension', models.CharField(blank=True, max_length=8, verbose_name='Расширение')),
+                ('completed', models.BooleanField(default=False, verbose_name='Завершена')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'загрузка',
+                'verbose_name_plural': 'Загрузки',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheConsumer',
+            fields=[
+                ('name', models.CharField(max_length=128, primary_key=True, serialize=False, verbose_name='Процесс')),
+                ('last_seq', models.BigIntegerField(default=0, verbose_name='Последнее событие')),
+                ('lag', models.FloatField(default=0, verbose_name='Задержка, с')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'процесс с локальным кэшем',
+                'verbose_name_plural': 'Процессы с локальным кэшем',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.CreateModel(
+            name='InvalidationEvent',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('topic', models.CharField(choices=[('recipe', 'Рецепт'), ('tag', 'Метка'), ('ingredient', 'Ингредиент'), ('user', 'Пользователь'), ('token', 'Токен')], max_length=16, verbose_name='Объект')),
+                ('key', models.CharField(max_length=64, verbose_name='Ключ')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'событие сброса кэша',
+                'verbose_name_plural': 'События сброса кэша',
+                'ordering': ('seq',),
+            },
+        ),
+    ]
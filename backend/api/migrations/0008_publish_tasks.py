@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-19 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublishTask',
+            fields=[
+                ('recipe_id', models.PositiveBigIntegerField(primary_key=True, serialize=False, verbose_name='Id рецепта')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+            ],
+            options={
+                'verbose_name': 'задача публикации',
+                'verbose_name_plural': 'Задачи публикации',
+            },
+        ),
+    ]
@@ -0,0 +1,237 @@
+"""Модели для служебных данных API."""
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class RequestProfile(models.Model):
+    """Профиль выполнения запроса с журналом SQL."""
+
+    SAMPLING = 'sampling'
+    CPROFILE = 'cprofile'
+    MODES = (
+        (SAMPLING, 'Сэмплирование стеков'),
+        (CPROFILE, 'cProfile'),
+    )
+    PATH_LENGTH = 512
+
+    created = models.DateTimeField('Дата', auto_now_add=True, db_index=True)
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Путь', max_length=PATH_LENGTH)
+    view_name = models.CharField(
+        'Представление', max_length=128, db_index=True)
+    status_code = models.PositiveSmallIntegerField('Код ответа')
+    duration = models.FloatField('Длительность, с')
+    mode = models.CharField('Профилировщик', max_length=16, choices=MODES)
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        verbose_name='Пользователь')
+    profile = models.TextField('Профиль')
+    queries = models.JSONField('SQL-запросы', default=list)
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
+
+
+class RecipeDocument(models.Model):
+    """Готовое представление рецепта для чтения (см. api.read_model)."""
+
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        related_name='document')
+    document = models.JSONField('Документ')
+    updated = models.DateTimeField('Дата сборки', auto_now=True)
+
+    class Meta:
+        verbose_name = 'документ рецепта'
+        verbose_name_plural = 'Документы рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class PurgeTask(models.Model):
+    """Фоновое удаление пользователя или рецепта (см. api.purge)."""
+
+    USER = 'user'
+    RECIPE = 'recipe'
+    KINDS = (
+        (USER, 'Пользователь'),
+        (RECIPE, 'Рецепт'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField('Объект', max_length=16, choices=KINDS)
+    object_id = models.PositiveBigIntegerField('Id объекта')
+    label = models.CharField('Название', max_length=256)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=PENDING,
+        db_index=True)
+    created = models.DateTimeField('Дата удаления', auto_now_add=True)
+    started = models.DateTimeField('Начало очистки', null=True, blank=True)
+    finished = models.DateTimeField(
+        'Окончание очистки', null=True, blank=True)
+    total = models.PositiveBigIntegerField('Записей (оценка)', default=0)
+    purged = models.PositiveBigIntegerField('Удалено записей', default=0)
+    files_deleted = models.PositiveIntegerField('Удалено файлов', default=0)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'задача удаления'
+        verbose_name_plural = 'Задачи удаления'
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.label}'
+
+
+class MediaFile(models.Model):
+    """Количество ссылок на файл хранилища по содержимому (api.media)."""
+
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    references = models.PositiveIntegerField('Ссылок', default=0)
+    updated = models.DateTimeField('Изменено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+class Upload(models.Model):
+    """Загрузка изображения, в том числе по частям (см. api.uploads)."""
+
+    token = models.CharField('Токен', max_length=64, primary_key=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='uploads',
+        verbose_name='Пользователь')
+    size = models.PositiveIntegerField('Размер', null=True, blank=True)
+    received = models.PositiveIntegerField('Получено', default=0)
+    extension = models.CharField('Расширение', max_length=8, blank=True)
+    completed = models.BooleanField('Завершена', default=False)
+    created = models.DateTimeField('Дата', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'загрузка'
+        verbose_name_plural = 'Загрузки'
+
+    def __str__(self):
+        return self.token
+
+
+class InvalidationEvent(models.Model):
+    """Изменение объекта для сброса кэшей процессов (см. api.invalidation)."""
+
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    USER = 'user'
+    TOKEN = 'token'
+    TOPICS = (
+        (RECIPE, 'Рецепт'),
+        (TAG, 'Метка'),
+        (INGREDIENT, 'Ингредиент'),
+        (USER, 'Пользователь'),
+        (TOKEN, 'Токен'),
+    )
+
+    seq = models.BigAutoField(primary_key=True)
+    topic = models.CharField('Объект', max_length=16, choices=TOPICS)
+    key = models.CharField('Ключ', max_length=64)
+    created = models.DateTimeField('Дата', auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ('seq',)
+        verbose_name = 'событие сброса кэша'
+        verbose_name_plural = 'События сброса кэша'
+
+    def __str__(self):
+        return f'{self.topic} {self.key}'
+
+
+class CacheConsumer(models.Model):
+    """Позиция и задержка чтения событий сброса кэша процессом."""
+
+    name = models.CharField('Процесс', max_length=128, primary_key=True)
+    last_seq = models.BigIntegerField('Последнее событие', default=0)
+    lag = models.FloatField('Задержка, с', default=0)
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'процесс с локальным кэшем'
+        verbose_name_plural = 'Процессы с локальным кэшем'
+
+    def __str__(self):
+        return self.name
+
+
+class IdempotencyKey(models.Model):
+    """Ответ на запрос с заголовком Idempotency-Key (см. api.utils).
+
+    Хранится в базе, чтобы повтор запроса, попавший в другой воркер или
+    на другой сервер, получил тот же ответ.
+    """
+
+    KEY_LENGTH = 255
+    PATH_LENGTH = 512
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='idempotency_keys',
+        verbose_name='Пользователь')
+    key = models.CharField('Ключ', max_length=KEY_LENGTH)
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Путь', max_length=PATH_LENGTH)
+    status_code = models.PositiveSmallIntegerField('Код ответа')
+    data = models.JSONField('Ответ', null=True, encoder=DjangoJSONEncoder)
+    created = models.DateTimeField('Дата', auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'key', 'method', 'path'),
+                name='unique_idempotency_key'),
+        ]
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
+
+
+class PublishTask(models.Model):
+    """Рецепт, опубликованные файлы которого нужно перерисовать.
+
+    Очередь заполняется в транзакции изменения рецепта и обрабатывается
+    командой publish_static --loop (см. api.publisher).
+    """
+
+    recipe_id = models.PositiveBigIntegerField('Id рецепта', primary_key=True)
+    created = models.DateTimeField('Дата', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'задача публикации'
+        verbose_name_plural = 'Задачи публикации'
+
+    def __str__(self):
+        return str(self.recipe_id)
@@ -0,0 +1,156 @@
+"""Профилирование запросов по требованию."""
+import io
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication
+from api.constants import (
+    PROFILE_HEADER,
+    PROFILE_SAMPLING_INTERVAL,
+    PROFILE_TOP_FUNCTIONS
+)
+from api.models import RequestProfile
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return (f'{code.co_name} ({os.path.basename(code.co_filename)}:'
+            f'{code.co_firstlineno})')
+
+
+class SamplingProfiler:
+    """Профилировщик, периодически снимающий стек потока запроса.
+
+    Результат - стеки в свернутом формате (folded stacks), из которого
+    строится flame graph.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLING_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def result(self):
+        return '\n'.join(
+            f'{stack} {count}' for stack, count in self.stacks.items())
+
+
+class CProfileProfiler:
+    """Детерминированный профилировщик cProfile.
+
+    cProfile и pstats нужны только профилируемым запросам, поэтому
+    импортируются при первом использовании, а не при запуске воркера.
+    """
+
+    def __init__(self):
+        import cProfile
+
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def result(self):
+        import pstats
+
+        stream = io.StringIO()
+        pstats.Stats(self.profile, stream=stream).sort_stats(
+            'cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        return stream.getvalue()
+
+
+PROFILERS = {
+    RequestProfile.SAMPLING: SamplingProfiler,
+    RequestProfile.CPROFILE: CProfileProfiler,
+}
+
+
+def is_staff(request):
+    """Проверяет, что запрос отправлен сотрудником (токен или сессия)."""
+    try:
+        auth = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    # В API нет AuthenticationMiddleware и request.user (api.middleware).
+    user = auth[0] if auth else getattr(request, 'user', None)
+    return user is not None and user.is_authenticated and user.is_staff
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос и сохраняет результат вместе с SQL-запросами.
+
+    Профилирование включается заголовком X-Profile от сотрудника
+    (значение sampling или cprofile) или случайно с вероятностью
+    PROFILING_SAMPLE_RATE. Случайная выборка использует только
+    сэмплирующий профилировщик как наименее затратный.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def get_mode(self, request):
+        mode = request.headers.get(PROFILE_HEADER)
+        if mode is not None and is_staff(request):
+            return mode if mode in PROFILERS else RequestProfile.SAMPLING
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return RequestProfile.SAMPLING
+        return None
+
+    def __call__(self, request):
+        mode = self.get_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        profiler = PROFILERS[mode]()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        duration = time.perf_counter() - start
+        user = getattr(request, 'user', None)
+        match = request.resolver_match
+        RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:RequestProfile.PATH_LENGTH],
+            view_name=match.view_name if match else '',
+            status_code=response.status_code,
+            duration=duration,
+            mode=mode,
+            user=user if user and user.is_authenticated else None,
+            profile=profiler.result(),
+            queries=context.captured_queries,
+        )
+        return response
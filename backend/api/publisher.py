@@ -0,0 +1,262 @@
+"""Публикация анонимных ответов API в файлы.
+
+Анонимные страницы ленты и детали рецептов одинаковы для всех
+посетителей. Публикатор сохраняет их JSON в PUBLISH_ROOT по пути
+запроса: /api/recipes/index?page=1&limit=6&tags=breakfast.json и
+/api/recipes/<id>/index.json, с gzip-копией рядом. nginx
+(nginx/published_recipes.conf) отдает эти файлы через try_files, а
+запросы с заголовком Authorization, другие методы и строки запроса
+передает Django.
+
+Публикуются первые PUBLISH_FEED_PAGES страниц общей ленты и ленты
+каждой метки со строкой запроса, которую отправляет фронтенд:
+page=N&limit=PUBLISH_PAGE_SIZE[&tags=...], страница по умолчанию (без
+параметров и с одним tags) и детали всех рецептов. nginx ищет файл по
+строке запроса без изменений, поэтому другой порядок параметров
+обслуживает Django.
+
+Изменение рецепта ставит его в очередь PublishTask в той же
+транзакции, а команда publish_static --loop перерисовывает детали
+рецептов из очереди и только те страницы, у которых поменялись
+количество, состав или содержимое рецептов.
+
+Просмотры деталей из файлов не доходят до Django и учитываются только
+при переходе по короткой ссылке.
+"""
+import json
+import os
+import shutil
+import tempfile
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import QueryDict
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.compression import compress
+from api.constants import (
+    PUBLISH_BATCH_SIZE,
+    PUBLISH_FEED_PAGES,
+    PUBLISH_PAGE_SIZE
+)
+from api.export import chunked
+from api.filters import RecipeFilter
+from api.models import PublishTask
+from api.read_model import documents_queryset
+from api.serializers import RecipeReadSerializer
+from recipes.models import Recipe, Tag
+
+FEED_PATH = '/api/recipes/'
+
+
+def make_request(path):
+    """Анонимный GET-запрос к адресу сайта из PUBLISH_BASE_URL."""
+    url = urlsplit(settings.PUBLISH_BASE_URL)
+    request = RequestFactory().get(
+        path, secure=url.scheme == 'https', HTTP_HOST=url.netloc,
+        HTTP_ACCEPT='application/json', HTTP_CACHE_CONTROL='no-cache')
+    request.user = AnonymousUser()
+    return request
+
+
+def get_directory(path):
+    return os.path.join(settings.PUBLISH_ROOT, path.strip('/'))
+
+
+def get_file_path(path, query=''):
+    """Файл ответа: index.json или index?<query>.json в каталоге пути."""
+    name = f'index?{query}.json' if query else 'index.json'
+    return os.path.join(get_directory(path), name)
+
+
+def write_file(path, content):
+    """Атомарно записывает ответ и его gzip-копию."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Копия .gz пишется первой: nginx не отдаст новый ответ со старой.
+    compressed = compress(content, 'gzip', static=True)
+    for name, data in ((f'{path}.gz', compressed), (path, content)):
+        with tempfile.NamedTemporaryFile(
+                dir=directory, suffix='.part', delete=False) as file:
+            file.write(data)
+        os.chmod(file.name, 0o644)
+        os.replace(file.name, name)
+
+
+def remove_file(path):
+    for name in (path, f'{path}.gz'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def read_page(path):
+    """(количество, id рецептов) опубликованной страницы или None."""
+    try:
+        with open(path, 'rb') as file:
+            page = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    return page['count'], [recipe['id'] for recipe in page['results']]
+
+
+def feed_queries(slug):
+    """Строки запроса публикуемых страниц ленты."""
+    tag = f'tags={slug}' if slug else ''
+    queries = [tag]
+    for page in range(1, PUBLISH_FEED_PAGES + 1):
+        query = f'page={page}&limit={PUBLISH_PAGE_SIZE}'
+        queries.append('&'.join(filter(None, (query, tag))))
+    return queries
+
+
+def page_ids(recipes, query):
+    """id рецептов страницы ленты, как ее разбивает пагинатор API."""
+    # Импорт при вызове, как в render_feed.
+    from api.views import RecipeViewSet
+    paginator = RecipeViewSet.pagination_class()
+    page = paginator.paginate_queryset(
+        recipes.values_list('pk', flat=True),
+        Request(make_request(f'{FEED_PATH}?{query}')))
+    return list(page or [])
+
+
+def feed_recipes(slug):
+    """Рецепты ленты в порядке выдачи API."""
+    queryset = Recipe.objects.all()
+    if slug is None:
+        return queryset
+    return RecipeFilter(
+        QueryDict(f'tags={slug}'), queryset=queryset,
+        request=make_request(FEED_PATH)).qs
+
+
+def render_feed(query):
+    """Тело ответа страницы ленты, как его отдает API."""
+    # Импорт при вызове: публикатор загружается с сигналами при запуске
+    # приложения, раньше представлений.
+    from api.views import RecipeViewSet
+    view = RecipeViewSet.as_view({'get': 'list'})
+    response = view(make_request(f'{FEED_PATH}?{query}' if query
+                                 else FEED_PATH))
+    response.render()
+    return response.content
+
+
+def publish_feeds(changed_ids=None):
+    """Перерисовывает страницы лент, возвращает их количество.
+
+    При changed_ids перерисовываются только страницы, у которых
+    изменились количество или состав, или содержащие эти рецепты.
+    """
+    published = 0
+    expected = set()
+    for slug in [None, *Tag.objects.order_by('slug').values_list(
+            'slug', flat=True)]:
+        recipes = feed_recipes(slug)
+        count = recipes.count()
+        for query in feed_queries(slug):
+            path = get_file_path(FEED_PATH, query)
+            expected.add(path)
+            if changed_ids is not None:
+                ids = page_ids(recipes, query)
+                if (read_page(path) == (count, ids)
+                        and not changed_ids.intersection(ids)):
+                    continue
+            write_file(path, render_feed(query))
+            published += 1
+    remove_stale_feeds(expected)
+    return published
+
+
+def remove_stale_feeds(expected):
+    """Удаляет страницы лент удаленных меток."""
+    directory = get_directory(FEED_PATH)
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith('.json') and path not in expected:
+            remove_file(path)
+
+
+def publish_recipes(recipe_ids):
+    """Публикует детали рецептов, удаляя файлы скрытых и удаленных.
+
+    Возвращает количество опубликованных рецептов.
+    """
+    context = {'request': Request(make_request(FEED_PATH))}
+    renderer = JSONRenderer()
+    published = 0
+    for chunk in chunked(recipe_ids, PUBLISH_BATCH_SIZE):
+        found = set()
+        for data in RecipeReadSerializer(
+                documents_queryset().filter(pk__in=chunk), many=True,
+                context=context).data:
+            write_file(get_file_path(f'{FEED_PATH}{data["id"]}/'),
+                       renderer.render(data))
+            found.add(data['id'])
+        for pk in set(chunk) - found:
+            remove_file(get_file_path(f'{FEED_PATH}{pk}/'))
+        published += len(found)
+    return published
+
+
+def remove_stale_recipes():
+    """Удаляет каталоги деталей рецептов, которых больше нет."""
+    directory = get_directory(FEED_PATH)
+    if not os.path.isdir(directory):
+        return
+    names = {name for name in os.listdir(directory) if name.isdigit()}
+    existing = {str(pk) for pk in Recipe.objects.filter(
+        pk__in=[int(name) for name in names]).values_list('pk', flat=True)}
+    for name in names - existing:
+        shutil.rmtree(os.path.join(directory, name))
+
+
+def publish_all():
+    """Полная публикация, возвращает (рецептов, страниц лент)."""
+    recipes = publish_recipes(Recipe.objects.order_by('pk').values_list(
+        'pk', flat=True).iterator(chunk_size=PUBLISH_BATCH_SIZE))
+    remove_stale_recipes()
+    return recipes, publish_feeds()
+
+
+def clear():
+    """Удаляет все опубликованные файлы."""
+    shutil.rmtree(get_directory(FEED_PATH), ignore_errors=True)
+
+
+def republish(recipe_ids):
+    """Ставит измененные рецепты в очередь публикации."""
+    if settings.STATIC_PUBLISHING:
+        add_tasks(recipe_ids)
+
+
+def add_tasks(recipe_ids):
+    PublishTask.objects.bulk_create(
+        (PublishTask(recipe_id=pk) for pk in set(recipe_ids)),
+        ignore_conflicts=True)
+
+
+def publish_pending():
+    """Перерисовывает файлы рецептов из очереди.
+
+    Возвращает количество обработанных рецептов. Задачи удаляются до
+    публикации, поэтому изменение во время нее снова попадет в очередь;
+    при ошибке задачи возвращаются в очередь.
+    """
+    recipe_ids = set(PublishTask.objects.order_by('created').values_list(
+        'recipe_id', flat=True)[:PUBLISH_BATCH_SIZE])
+    if not recipe_ids:
+        return 0
+    PublishTask.objects.filter(recipe_id__in=recipe_ids).delete()
+    try:
+        publish_recipes(sorted(recipe_ids))
+        publish_feeds(recipe_ids)
+    except Exception:
+        add_tasks(recipe_ids)
+        raise
+    return len(recipe_ids)
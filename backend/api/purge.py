@@ -0,0 +1,228 @@
+"""Удаление пользователей и рецептов в фоне.
+
+Каскадное удаление Django загружает все связанные объекты в память и
+удаляет их одной долгой транзакцией. Вместо этого объект помечается
+удаленным (deleted_at) и сразу исчезает из менеджеров objects, а для
+него создается PurgeTask. Команда purge_deleted удаляет связанные записи
+пачками по PURGE_BATCH_SIZE, каждая пачка - отдельной короткой
+транзакцией, и удаляет файлы изображений из хранилища. Вместе с пачкой
+записей избранного, списка покупок и подписок в журнал UserStateChange
+пишутся их удаления, как при удалении через API.
+"""
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_user
+from api.constants import PURGE_BATCH_SIZE, PURGE_MAX_DEPTH
+from api.invalidation import publish
+from api.models import InvalidationEvent, PurgeTask
+from api.storage import ContentAddressedStorage
+from api.utils import STATE_KINDS
+from recipes.models import FavoriteRecipe, Recipe, ShoppingcartRecipe
+from recipes.signals import recipe_changed
+from users.models import Subscription, UserStateChange
+
+User = get_user_model()
+
+MODELS = {
+    PurgeTask.USER: User,
+    PurgeTask.RECIPE: Recipe,
+}
+# Поле object_id журнала состояния для связей пользователя.
+STATE_TARGETS = {
+    FavoriteRecipe: 'recipe_id',
+    ShoppingcartRecipe: 'recipe_id',
+    Subscription: 'following_id',
+}
+
+
+def delete_recipe(recipe):
+    """Скрывает рецепт и ставит его очистку в очередь."""
+    with transaction.atomic():
+        Recipe.all_objects.filter(pk=recipe.pk).update(
+            deleted_at=timezone.now())
+        PurgeTask.objects.create(
+            kind=PurgeTask.RECIPE, object_id=recipe.pk, label=recipe.name)
+        recipe_changed.send(sender=Recipe, recipe_ids=[recipe.pk])
+
+
+def delete_user(user):
+    """Скрывает пользователя и его рецепты и ставит очистку в очередь."""
+    now = timezone.now()
+    with transaction.atomic():
+        User.all_objects.filter(pk=user.pk).update(
+            deleted_at=now, is_active=False)
+        recipes = Recipe.all_objects.filter(
+            author=user, deleted_at__isnull=True)
+        recipe_ids = list(recipes.values_list('pk', flat=True))
+        recipes.update(deleted_at=now)
+        Token.objects.filter(user=user).delete()
+        PurgeTask.objects.create(
+            kind=PurgeTask.USER, object_id=user.pk, label=user.email)
+        recipe_changed.send(sender=Recipe, recipe_ids=recipe_ids)
+        publish(InvalidationEvent.USER, [user.pk])
+    invalidate_user(user.pk)
+
+
+def delete_object(obj):
+    """Скрывает пользователя или рецепт и ставит очистку в очередь."""
+    if isinstance(obj, Recipe):
+        delete_recipe(obj)
+    else:
+        delete_user(obj)
+
+
+def cascade_relations(model):
+    """Обратные связи модели, включая промежуточные таблицы M2M."""
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete
+        and (field.one_to_many or field.one_to_one)
+    ]
+
+
+def collect_files(model, queryset):
+    """Файлы записей: [(хранилище, имя файла)].
+
+    Файлы хранилища по содержимому могут принадлежать другим записям,
+    их удаляет сборщик мусора api.media.
+    """
+    files = []
+    for field in model._meta.concrete_fields:
+        if (isinstance(field, models.FileField)
+                and not isinstance(field.storage, ContentAddressedStorage)):
+            files += [
+                (field.storage, name) for name in queryset.values_list(
+                    field.attname, flat=True) if name
+            ]
+    return files
+
+
+def state_changes(model, queryset):
+    """Записи журнала состояния об удалении связей queryset.
+
+    Для пользователей, помеченных удаленными, записи не создаются: их
+    журнал удаляется вместе с ними.
+    """
+    if model not in STATE_TARGETS:
+        return []
+    return [
+        UserStateChange(user_id=user_id, kind=STATE_KINDS[model],
+                        object_id=object_id, deleted=True)
+        for user_id, object_id in queryset.filter(
+            user__deleted_at__isnull=True).values_list(
+                'user_id', STATE_TARGETS[model])
+    ]
+
+
+def estimate(model, queryset, depth=0):
+    """Оценивает количество записей, которые будут удалены."""
+    total = queryset.count()
+    if not total or depth >= PURGE_MAX_DEPTH:
+        return total
+    for relation in cascade_relations(model):
+        if relation.on_delete is models.CASCADE:
+            total += estimate(
+                relation.related_model,
+                relation.related_model._base_manager.filter(**{
+                    f'{relation.field.name}__in': queryset.values('pk')}),
+                depth + 1)
+    return total
+
+
+class Purger:
+    """Удаляет записи с зависимыми записями пачками."""
+
+    def __init__(self, task):
+        self.task = task
+
+    def purge(self, model, pks):
+        for relation in cascade_relations(model):
+            related_model = relation.related_model
+            queryset = related_model._base_manager.filter(
+                **{f'{relation.field.name}__in': pks})
+            if relation.on_delete is models.CASCADE:
+                while True:
+                    batch = list(queryset.values_list(
+                        'pk', flat=True)[:PURGE_BATCH_SIZE])
+                    if not batch:
+                        break
+                    self.purge(related_model, batch)
+            elif relation.on_delete is models.SET_NULL:
+                while True:
+                    batch = list(queryset.values_list(
+                        'pk', flat=True)[:PURGE_BATCH_SIZE])
+                    if not batch:
+                        break
+                    related_model._base_manager.filter(pk__in=batch).update(
+                        **{relation.field.name: None})
+            elif relation.on_delete is not models.DO_NOTHING:
+                raise ValueError(
+                    f'Неподдерживаемое удаление связи {relation}')
+        self.delete_rows(model, pks)
+
+    def delete_rows(self, model, pks):
+        """Удаляет записи без зависимых записей и их файлы."""
+        queryset = model._base_manager.filter(pk__in=pks)
+        files = collect_files(model, queryset)
+        with transaction.atomic():
+            changes = state_changes(model, queryset)
+            deleted, _ = queryset.delete()
+            UserStateChange.objects.bulk_create(changes)
+            PurgeTask.objects.filter(pk=self.task.pk).update(
+                purged=F('purged') + deleted)
+            if files:
+                transaction.on_commit(lambda: self.delete_files(files))
+
+    def delete_files(self, files):
+        deleted = 0
+        for storage, name in files:
+            if storage.exists(name):
+                storage.delete(name)
+                deleted += 1
+        PurgeTask.objects.filter(pk=self.task.pk).update(
+            files_deleted=F('files_deleted') + deleted)
+
+
+def run_task(task):
+    """Выполняет задачу удаления, если ее не взял другой процесс.
+
+    Возвращает True при успешном удалении.
+    """
+    claimed = PurgeTask.objects.filter(
+        pk=task.pk, status=PurgeTask.PENDING).update(
+            status=PurgeTask.RUNNING, started=timezone.now())
+    if not claimed:
+        return False
+    model = MODELS[task.kind]
+    try:
+        PurgeTask.objects.filter(pk=task.pk).update(total=estimate(
+            model, model._base_manager.filter(pk=task.object_id)))
+        Purger(task).purge(model, [task.object_id])
+    except Exception as error:
+        PurgeTask.objects.filter(pk=task.pk).update(
+            status=PurgeTask.FAILED, error=repr(error),
+            finished=timezone.now())
+        return False
+    PurgeTask.objects.filter(pk=task.pk).update(
+        status=PurgeTask.DONE, finished=timezone.now())
+    return True
+
+
+def run_pending(log=None):
+    """Выполняет все задачи в очереди, возвращает количество успешных.
+
+    Задача с ошибкой получает статус FAILED и может быть перезапущена
+    из админки, остальные задачи выполняются дальше.
+    """
+    done = 0
+    for task in PurgeTask.objects.filter(
+            status=PurgeTask.PENDING).order_by('pk'):
+        succeeded = run_task(task)
+        done += succeeded
+        if log:
+            log(f'{"Удален" if succeeded else "Ошибка удаления"}: {task}')
+    return done
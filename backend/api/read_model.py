@@ -0,0 +1,130 @@
+"""Модель чтения рецептов: готовые JSON-документы.
+
+Документ рецепта - вывод RecipeReadSerializer без данных текущего
+пользователя: is_favorited, is_in_shopping_cart и author.is_subscribed
+сохраняются как False и заполняются при выдаче тремя запросами на
+страницу. Ссылки на изображения хранятся относительными.
+"""
+from django.db import transaction
+from django.db.models import Prefetch
+
+from api.models import RecipeDocument
+from api.serializers import RecipeReadSerializer
+from recipes.models import (
+    FavoriteRecipe,
+    Recipe,
+    RecipeIngredient,
+    ShoppingcartRecipe
+)
+from users.models import Subscription
+
+CHUNK_SIZE = 500  # Количество документов, собираемых за раз
+
+
+def documents_queryset():
+    return Recipe.objects.select_related('author').prefetch_related(
+        'tags', Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related('ingredient')))
+
+
+def build_documents(recipe_ids):
+    """Собирает документы рецептов, {id: документ}."""
+    recipes = documents_queryset().filter(pk__in=recipe_ids)
+    return {
+        document['id']: document
+        for document in RecipeReadSerializer(recipes, many=True).data
+    }
+
+
+def rebuild_documents(recipe_ids):
+    """Пересобирает и сохраняет документы рецептов пачками."""
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        chunk = recipe_ids[start:start + CHUNK_SIZE]
+        documents = build_documents(chunk)
+        with transaction.atomic():
+            RecipeDocument.objects.filter(recipe_id__in=chunk).delete()
+            RecipeDocument.objects.bulk_create(
+                RecipeDocument(recipe_id=recipe_id, document=document)
+                for recipe_id, document in documents.items())
+
+
+def absolute_url(request, url):
+    return request.build_absolute_uri(url) if url else url
+
+
+def read_documents(request, recipe_ids, user_state=True):
+    """Документы рецептов в порядке recipe_ids с данными пользователя.
+
+    Отсутствующие документы собираются и сохраняются на лету. При
+    user_state=False поля, зависящие от пользователя, убираются.
+    """
+    recipe_ids = list(recipe_ids)
+    documents = {
+        recipe_id: document for recipe_id, document
+        in RecipeDocument.objects.filter(
+            recipe_id__in=recipe_ids).values_list('recipe_id', 'document')
+    }
+    missing = [pk for pk in recipe_ids if pk not in documents]
+    if missing:
+        rebuild_documents(missing)
+        documents.update(build_documents(missing))
+    documents = [documents[pk] for pk in recipe_ids if pk in documents]
+    for document in documents:
+        author = document['author']
+        author['avatar'] = absolute_url(request, author['avatar'])
+        document['image'] = absolute_url(request, document['image'])
+    if not user_state:
+        for document in documents:
+            del document['is_favorited'], document['is_in_shopping_cart']
+            del document['author']['is_subscribed']
+        return documents
+    user = request.user
+    favorites = cart = subscriptions = set()
+    if user.is_authenticated:
+        favorites = set(FavoriteRecipe.objects.filter(
+            user=user, recipe_id__in=recipe_ids).values_list(
+                'recipe_id', flat=True))
+        cart = set(ShoppingcartRecipe.objects.filter(
+            user=user, recipe_id__in=recipe_ids).values_list(
+                'recipe_id', flat=True))
+        subscriptions = set(Subscription.objects.filter(
+            user=user, following_id__in={
+                document['author']['id'] for document in documents
+            }).values_list('following_id', flat=True))
+    for document in documents:
+        document['is_favorited'] = document['id'] in favorites
+        document['is_in_shopping_cart'] = document['id'] in cart
+        author = document['author']
+        author['is_subscribed'] = author['id'] in subscriptions
+    return documents
+
+
+def check_documents(fix=False):
+    """Сравнивает сохраненные документы со свежесобранными.
+
+    Возвращает список id рецептов с отличающимися или отсутствующими
+    документами, при fix=True пересобирает их.
+    """
+    broken = []
+    recipe_ids = list(Recipe.objects.order_by('pk').values_list(
+        'pk', flat=True))
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        chunk = recipe_ids[start:start + CHUNK_SIZE]
+        stored = dict(RecipeDocument.objects.filter(
+            recipe_id__in=chunk).values_list('recipe_id', 'document'))
+        for recipe_id, document in build_documents(chunk).items():
+            if stored.get(recipe_id) != document:
+                broken.append(recipe_id)
+    if fix and broken:
+        rebuild_documents(broken)
+    return broken
+
+
+def rebuild_range(first_id, last_id):
+    """Пересобирает документы рецептов с id в диапазоне."""
+    recipe_ids = list(Recipe.objects.filter(
+        pk__range=(first_id, last_id)).values_list('pk', flat=True))
+    rebuild_documents(recipe_ids)
+    return len(recipe_ids)
@@ -1,23 +1,29 @@
 from django.contrib.auth import get_user_model
-from django.db import transaction
+from django.db import OperationalError, transaction
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework.validators import UniqueTogetherValidator
 
+from api.constants import BATCH_MAX_SIZE
+from api.db import retry_on_locked
+from api.fieldsets import select_fields
 from api.serializers_fields import Base64ImageField
-from recipes.models import (
-    FavoriteRecipe,
-    Ingredient,
-    Recipe,
-    RecipeIngredient,
-    ShoppingcartRecipe,
-    Tag
-)
-from users.models import Subscription
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.signals import recipe_changed
 
 User = get_user_model()
 
+# Поля, зависящие от текущего пользователя.
+USER_STATE_FIELDS = ('is_subscribed', 'is_favorited', 'is_in_shopping_cart')
+
+
+def omit_user_state(serializer, fields):
+    """Убирает поля пользователя, если ответ не зависит от пользователя."""
+    if serializer.context.get('omit_user_state'):
+        for name in USER_STATE_FIELDS:
+            fields.pop(name, None)
+    return fields
+
 
 class UserCreateSerializer(UserCreateSerializer):
     """Сериализатор для регистрации пользователя."""
@@ -37,6 +43,19 @@ class AvatarSerializer(serializers.ModelSerializer):
         model = User
         fields = ('avatar',)
 
+    def update(self, instance, validated_data):
+        instance.avatar = validated_data['avatar']
+        instance.save(update_fields=('avatar',))
+        return instance
+
+
+class BatchSerializer(serializers.Serializer):
+    """Сериализатор для списка id в пакетных запросах."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=BATCH_MAX_SIZE)
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для пользователя."""
@@ -47,7 +66,13 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'first_name',
                   'last_name', 'avatar', 'is_subscribed')
 
+    def get_fields(self):
+        return omit_user_state(
+            self, select_fields(self, super().get_fields()))
+
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         request = self.context.get('request', False)
         return (request and request.user.is_authenticated
                 and obj.follower.filter(user=request.user).exists())
@@ -109,12 +134,20 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   "text", "cooking_time")
         read_only_fields = fields
 
+    def get_fields(self):
+        return omit_user_state(
+            self, select_fields(self, super().get_fields()))
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
         request = self.context.get('request', False)
         return (request and request.user.is_authenticated
                 and obj.favoriterecipe.filter(user=request.user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'in_shopping_cart'):
+            return obj.in_shopping_cart
         request = self.context.get('request', False)
         return (request and request.user.is_authenticated
                 and obj.shoppingcartrecipe.filter(user=request.user).exists())
@@ -189,32 +222,43 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         RecipeIngredient.objects.bulk_create(ingredients_to_create,
                                              ignore_conflicts=True)
 
+    @retry_on_locked
     @transaction.atomic
     def create(self, validated_data):
         """Создание рецепта."""
         author = self.context['request'].user
+        # Копия: повтор retry_on_locked получает те же данные.
+        validated_data = dict(validated_data)
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         try:
             recipe = Recipe.objects.create(**validated_data, author=author)
-            recipe.tags.set(tags_data)
+            recipe.set_tags(tags_data)
             self.add_ingredients(recipe, ingredients_data)
+            recipe_changed.send(sender=Recipe, recipe_ids=[recipe.pk])
             return recipe
+        except OperationalError:
+            # Занятую базу повторяет retry_on_locked.
+            raise
         except Exception as e:
             raise ValidationError(f'Ошибка при создании рецепта: {str(e)}')
 
+    @retry_on_locked
     @transaction.atomic
     def update(self, instance, validated_data):
         """Обновление существующего рецепта."""
+        validated_data = dict(validated_data)
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         instance = super().update(instance, validated_data)
         try:
             RecipeIngredient.objects.filter(recipe=instance).delete()
             self.add_ingredients(instance, ingredients_data)
-            instance.tags.clear()
-            instance.tags.set(tags_data)
+            instance.set_tags(tags_data)
+            recipe_changed.send(sender=Recipe, recipe_ids=[instance.pk])
             return instance
+        except OperationalError:
+            raise
         except Exception as e:
             raise ValidationError(f'Ошибка при создании рецепта: {str(e)}')
 
@@ -232,70 +276,6 @@ class ShortRecipeReadSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписок."""
-
-    class Meta:
-        model = Subscription
-        fields = ['user', 'following']
-
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('user', 'following'),
-                message="Нельзя подписаться повторно."
-            )
-        ]
-
-    def validate(self, data):
-        """Проверка, что пользователь не подписывается на себя."""
-        if data.get('user') == data.get('following'):
-            raise serializers.ValidationError("Нельзя подписаться на себя.")
-        return data
-
-    def to_representation(self, instance):
-        return UserSubscribeRecipesCountSerializer(instance.following,
-                                                   context=self.context).data
-
-
-class BaseRecipeSerializer(serializers.ModelSerializer):
-    """Базовый сериализатор для избранных и корзины."""
-
-    class Meta:
-        abstract = True
-        fields = ['user', 'recipe']
-
-    def to_representation(self, instance):
-        return ShortRecipeReadSerializer(instance.recipe,
-                                         context=self.context).data
-
-
-class FavoriteSerializer(BaseRecipeSerializer):
-    """Сериализатор для избранных."""
-    class Meta(BaseRecipeSerializer.Meta):
-        model = FavoriteRecipe
-        validators = [
-            UniqueTogetherValidator(
-                queryset=FavoriteRecipe.objects.all(),
-                fields=('user', 'recipe'),
-                message="Вы уже добавили этот рецепт в избранные."
-            )
-        ]
-
-
-class ShoppingcartSerializer(BaseRecipeSerializer):
-    """Сериализатор для корзины."""
-    class Meta(BaseRecipeSerializer.Meta):
-        model = ShoppingcartRecipe
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingcartRecipe.objects.all(),
-                fields=('user', 'recipe'),
-                message="Вы уже добавили этот рецепт в корзину."
-            )
-        ]
-
-
 class UserSubscribeRecipesCountSerializer(UserSerializer):
     """Сериализатор для списка подписок пользователя."""
     recipes = ShortRecipeReadSerializer(many=True, read_only=True)
@@ -309,12 +289,14 @@ class UserSubscribeRecipesCountSerializer(UserSerializer):
                             'last_name', 'avatar']
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_total'):
+            return obj.recipes_total
         return obj.recipes.count()
 
     def to_representation(self, instance):
         retpresentation = super().to_representation(instance)
         limit = self.context['request'].query_params.get('recipes_limit', 6)
-        if limit:
+        if limit and 'recipes' in retpresentation:
             retpresentation['recipes'] = (
                 retpresentation['recipes'][:int(limit)]
             )
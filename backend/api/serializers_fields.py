@@ -3,12 +3,22 @@ import base64
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from api.uploads import open_upload
+
 
 class Base64ImageField(serializers.ImageField):
+    """Изображение в base64 или токен загрузки из /api/uploads/."""
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        elif isinstance(data, str) and data:
+            data = open_upload(data, self.get_user())
 
         return super().to_internal_value(data)
+
+    def get_user(self):
+        request = self.context.get('request')
+        return request.user if request else self.context.get('user')
@@ -0,0 +1,168 @@
+"""Сигналы для сброса кэшей API и кэшей других процессов, документов и
+опубликованных файлов рецептов, учета файлов и настройки БД."""
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_token, invalidate_user
+from api.db import configure_sqlite
+from api.invalidation import invalidation_received, publish
+from api.media import MEDIA_FIELDS, acquire, file_name, release
+from api.models import InvalidationEvent
+from api.publisher import republish
+from api.read_model import rebuild_documents
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.signals import recipe_changed
+
+User = get_user_model()
+
+INVALIDATION_TOPICS = {
+    Recipe: InvalidationEvent.RECIPE,
+    Tag: InvalidationEvent.TAG,
+    Ingredient: InvalidationEvent.INGREDIENT,
+    User: InvalidationEvent.USER,
+}
+
+# Поля автора, попадающие в документ рецепта.
+AUTHOR_DOCUMENT_FIELDS = {
+    'username', 'email', 'first_name', 'last_name', 'avatar'
+}
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    configure_sqlite(connection)
+
+
+@receiver((post_save, post_delete), sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+def refresh_recipes(recipe_ids):
+    """Пересобирает документы и опубликованные файлы рецептов."""
+    recipe_ids = list(recipe_ids)
+    rebuild_documents(recipe_ids)
+    republish(recipe_ids)
+
+
+@receiver(recipe_changed)
+def rebuild_changed_documents(sender, recipe_ids, **kwargs):
+    refresh_recipes(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=Token)
+def publish_token_invalidation(sender, instance, **kwargs):
+    publish(InvalidationEvent.TOKEN, [instance.key])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def publish_invalidation(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя меняет только last_login.
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    publish(INVALIDATION_TOPICS[sender], [instance.pk])
+
+
+@receiver(recipe_changed)
+def publish_recipes_invalidation(sender, recipe_ids, **kwargs):
+    publish(InvalidationEvent.RECIPE, recipe_ids)
+
+
+@receiver(invalidation_received)
+def evict_local_caches(sender, topic, keys, **kwargs):
+    """Сбрасывает кэш токенов после изменений в других процессах."""
+    if topic == InvalidationEvent.TOKEN:
+        for key in keys:
+            invalidate_token(key)
+    elif topic == InvalidationEvent.USER:
+        for key in keys:
+            invalidate_user(int(key))
+
+
+@receiver(post_save, sender=Tag)
+def rebuild_tag_documents(sender, instance, created, **kwargs):
+    if not created:
+        refresh_recipes(Recipe.objects.filter(
+            tags=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def rebuild_ingredient_documents(sender, instance, created, **kwargs):
+    if not created:
+        refresh_recipes(Recipe.objects.filter(
+            ingredients=instance).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_document_recipes(sender, instance, **kwargs):
+    field = 'tags' if sender is Tag else 'ingredients'
+    instance._document_recipe_ids = list(Recipe.objects.filter(
+        **{field: instance}).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def rebuild_deleted_documents(sender, instance, **kwargs):
+    refresh_recipes(getattr(instance, '_document_recipe_ids', ()))
+
+
+@receiver(post_save, sender=User)
+def rebuild_author_documents(sender, instance, update_fields, **kwargs):
+    if update_fields and not AUTHOR_DOCUMENT_FIELDS & set(update_fields):
+        return
+    refresh_recipes(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_media_files(sender, instance, **kwargs):
+    # Отложенные поля не загружаются: их прежнее значение неизвестно.
+    instance._media_files = {
+        field: file_name(instance.__dict__[field])
+        for model, field in MEDIA_FIELDS
+        if model is sender and field in instance.__dict__
+    }
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def count_media_references(sender, instance, update_fields, **kwargs):
+    for model, field in MEDIA_FIELDS:
+        if (model is not sender or field not in instance.__dict__
+                or update_fields and field not in update_fields):
+            continue
+        old = instance._media_files.get(field)
+        new = file_name(instance.__dict__[field])
+        if new != old:
+            acquire(new)
+            if old is not None:
+                release(old)
+            instance._media_files[field] = new
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_media_references(sender, instance, **kwargs):
+    for name in instance._media_files.values():
+        release(name)
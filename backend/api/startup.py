@@ -0,0 +1,55 @@
+"""Подготовка приложения в мастер-процессе gunicorn до запуска воркеров.
+
+При preload_app приложение импортируется один раз в мастере, а воркеры
+получают его память через fork. Чтобы страницы оставались общими,
+все ленивые кэши заполняются до fork, а объекты переносятся в
+постоянное поколение сборщика мусора (gc.freeze): иначе сборщик в
+каждом воркере обходит их и меняет счетчики ссылок, копируя страницы.
+"""
+import gc
+import logging
+
+from django.apps import apps
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+from api.catalog import get_snapshot_name
+from api.serializers import (
+    IngredientSerializer,
+    RecipeReadSerializer,
+    TagSerializer,
+    UserSerializer
+)
+from recipes.models import Ingredient, Tag
+
+logger = logging.getLogger(__name__)
+
+WARM_SERIALIZERS = (
+    IngredientSerializer, RecipeReadSerializer, TagSerializer, UserSerializer
+)
+
+
+def warm_up():
+    """Заполняет кэши, которые иначе строил бы каждый воркер."""
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for model in apps.get_models():
+        model._meta.get_fields()
+    for serializer in WARM_SERIALIZERS:
+        serializer().fields
+    try:
+        # Снимок справочников создается один раз, а страницы таблиц
+        # попадают в кэш ОС, общий для всех воркеров.
+        get_snapshot_name()
+        list(Tag.objects.all())
+        list(Ingredient.objects.values_list('name', flat=True))
+    except (DatabaseError, OSError) as error:
+        logger.warning('Справочники не прогреты: %s', error)
+    # Соединения с базой нельзя разделять между процессами.
+    connections.close_all()
+
+
+def freeze():
+    """Переносит объекты мастера в постоянное поколение сборщика."""
+    gc.collect()
+    gc.freeze()
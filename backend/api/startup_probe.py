@@ -0,0 +1,88 @@
+"""Замер времени запуска и памяти воркеров (команда startup_report).
+
+Модуль запускается в отдельном процессе до загрузки Django, поэтому
+модули проекта импортируются внутри функций.
+"""
+import json
+import os
+import sys
+import time
+
+PROBE_URLS = ('/api/recipes/?limit=10', '/api/tags/', '/api/ingredients/')
+
+
+def memory_usage():
+    """RSS, PSS и собственная память процесса (USS), МиБ (только Linux)."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                values[name] = int(value.split()[0]) / 1024
+    return {
+        'rss': values['Rss'],
+        'pss': values['Pss'],
+        'uss': values['Private_Clean'] + values['Private_Dirty'],
+    }
+
+
+def serve(requests, start):
+    """Выполняет запросы, возвращает время до первого ответа и память."""
+    from django.test import Client
+
+    client = Client(SERVER_NAME='localhost')
+    first_response = None
+    for index in range(requests):
+        client.get(PROBE_URLS[index % len(PROBE_URLS)])
+        if first_response is None:
+            first_response = time.perf_counter() - start
+    return {'first_response': first_response, **memory_usage()}
+
+
+def plain_worker(requests):
+    """Воркер, загружающий приложение сам, как gunicorn без preload."""
+    start = time.perf_counter()
+    from backend.wsgi import application  # noqa: F401
+
+    return [serve(requests, start)]
+
+
+def preload_workers(workers, requests):
+    """Мастер загружает приложение и запускает воркеры через fork."""
+    import gc
+
+    start = time.perf_counter()
+    gc.disable()
+    from backend.wsgi import application  # noqa: F401
+    from api.startup import freeze, warm_up
+
+    warm_up()
+    freeze()
+    preload = time.perf_counter() - start
+    pipes = []
+    for _ in range(workers):
+        read, write = os.pipe()
+        if os.fork() == 0:
+            os.close(read)
+            gc.enable()
+            result = serve(requests, time.perf_counter())
+            os.write(write, json.dumps(result).encode())
+            os._exit(0)
+        os.close(write)
+        pipes.append(read)
+    results = []
+    for read in pipes:
+        with os.fdopen(read) as file:
+            results.append({**json.loads(file.read()), 'preload': preload})
+    for _ in pipes:
+        os.wait()
+    return results
+
+
+def main():
+    mode, workers, requests = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+    if mode == 'preload':
+        results = preload_workers(workers, requests)
+    else:
+        results = plain_worker(requests)
+    print(json.dumps(results))
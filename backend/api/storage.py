@@ -0,0 +1,66 @@
+"""Хранилище файлов с именами по содержимому.
+
+Имя файла - SHA-256 содержимого в каталоге upload_to поля, поэтому
+одинаковые изображения хранятся один раз, а повторная загрузка не
+записывает файл заново. Ссылки на файлы считает api.media, файлы без
+ссылок удаляет команда collect_media_garbage.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Подкаталог по первым символам хеша ограничивает число файлов в каталоге.
+PREFIX_LENGTH = 2
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище с дедупликацией по хешу содержимого."""
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(os.path.dirname(name), digest[:PREFIX_LENGTH],
+                            digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            # Свежая дата изменения защищает файл от сборщика мусора,
+            # пока запись со ссылкой на него не сохранена.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое.
+        return name
+
+    def _save(self, name, content):
+        # Запись во временный файл и переименование: параллельная загрузка
+        # того же содержимого не оставит частично записанный файл.
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                dir=directory, suffix='.part', delete=False) as file:
+            for chunk in content.chunks():
+                file.write(chunk)
+        os.chmod(file.name, self.file_permissions_mode or 0o644)
+        os.replace(file.name, full_path)
+        return name
+
+
+media_storage = ContentAddressedStorage()
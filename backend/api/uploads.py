@@ -0,0 +1,162 @@
+"""Загрузка изображений потоком и по частям.
+
+Изображение в base64 внутри JSON на треть больше исходного, а DRF и
+Base64ImageField держат в памяти и тело запроса, и декодированный файл.
+Эндпоинт /api/uploads/ пишет тело запроса (само изображение или
+multipart с полем file) во временный файл блоками по UPLOAD_CHUNK_SIZE и
+возвращает токен, который передается в поле image рецепта или avatar
+вместо base64.
+
+Загрузка по частям: POST с заголовком Upload-Length создает загрузку,
+каждый PATCH с заголовком Upload-Offset дописывает следующую часть.
+После обрыва клиент узнает полученный объем запросом GET и продолжает
+с этой позиции. Часть сначала пишется во временный файл, а в файл
+загрузки - только после того, как запрос сравнением с received в базе
+закрепил за собой эту позицию: параллельные запросы с той же частью не
+смешивают данные. Незавершенные и старые загрузки удаляет
+collect_media_garbage.
+"""
+import os
+import secrets
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from django.utils.functional import cached_property
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.constants import (
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_MAX_SIZE,
+    UPLOAD_TOKEN_BYTES,
+    UPLOAD_TTL
+)
+from api.models import Upload
+
+
+class UploadConflict(Exception):
+    """Позиция части не совпадает с уже полученным объемом."""
+
+
+class UploadedImage(File):
+    """Файл загрузки без открытого дескриптора.
+
+    ImageField проверяет файл по пути, а хранилище читает его через
+    chunks, которые открывают файл только на время чтения.
+    """
+
+    def __init__(self, path, name):
+        super().__init__(None, name)
+        self.path = path
+
+    @cached_property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def temporary_file_path(self):
+        return self.path
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # chunks читает файл с начала при каждом вызове.
+        return 0
+
+    def chunks(self, chunk_size=None):
+        with open(self.path, 'rb') as file:
+            yield from File(file).chunks(chunk_size)
+
+
+def get_path(token):
+    return os.path.join(settings.UPLOAD_ROOT, f'{token}.part')
+
+
+def create_upload(user, size=None):
+    """Создает загрузку, size - полный размер для загрузки по частям."""
+    if size is not None and not 0 < size <= UPLOAD_MAX_SIZE:
+        raise ValidationError({'size': [
+            f'Размер файла должен быть от 1 до {UPLOAD_MAX_SIZE} байт.']})
+    os.makedirs(settings.UPLOAD_ROOT, exist_ok=True)
+    upload = Upload.objects.create(
+        token=secrets.token_urlsafe(UPLOAD_TOKEN_BYTES), user=user, size=size)
+    open(get_path(upload.token), 'wb').close()
+    return upload
+
+
+def write_chunk(upload, stream, offset):
+    """Дописывает данные потока с позиции offset.
+
+    Загрузка без размера завершается после первой части, загрузка по
+    частям - после получения size байт.
+    """
+    if upload.completed or offset != upload.received:
+        raise UploadConflict
+    limit = UPLOAD_MAX_SIZE if upload.size is None else upload.size
+    received = offset
+    with tempfile.TemporaryFile(dir=settings.UPLOAD_ROOT) as part:
+        while stream is not None:
+            data = stream.read(UPLOAD_CHUNK_SIZE)
+            if not data:
+                break
+            received += len(data)
+            if received > limit:
+                raise ValidationError({'file': [
+                    f'Размер файла превышает {limit} байт.']})
+            part.write(data)
+        if not Upload.objects.filter(
+                pk=upload.pk, received=offset,
+                completed=False).update(received=received):
+            # Ту же часть параллельно получил другой запрос.
+            raise UploadConflict
+        part.seek(0)
+        with open(get_path(upload.token), 'r+b') as file:
+            file.seek(offset)
+            shutil.copyfileobj(part, file, UPLOAD_CHUNK_SIZE)
+    upload.received = received
+    if upload.size is None or received == upload.size:
+        complete(upload)
+
+
+def complete(upload):
+    """Проверяет, что загружено изображение, и завершает загрузку."""
+    path = get_path(upload.token)
+    try:
+        with Image.open(path) as image:
+            image.verify()
+            extension = image.format.lower()
+    except Exception:
+        delete_upload(upload)
+        raise ValidationError({'file': [
+            'Загрузите корректное изображение.']})
+    upload.extension = extension
+    upload.completed = True
+    upload.save(update_fields=('extension', 'completed'))
+
+
+def delete_upload(upload):
+    if os.path.exists(get_path(upload.token)):
+        os.remove(get_path(upload.token))
+    upload.delete()
+
+
+def open_upload(token, user):
+    """Файл завершенной загрузки пользователя для поля изображения."""
+    upload = Upload.objects.filter(
+        token=token, user=user, completed=True,
+        created__gte=timezone.now() - timedelta(seconds=UPLOAD_TTL)).first()
+    if upload is None:
+        raise ValidationError('Загрузка не найдена или не завершена.')
+    return UploadedImage(get_path(token), name=f'upload.{upload.extension}')
+
+
+def delete_expired_uploads():
+    """Удаляет загрузки старше UPLOAD_TTL, возвращает их количество."""
+    uploads = Upload.objects.filter(
+        created__lt=timezone.now() - timedelta(seconds=UPLOAD_TTL))
+    deleted = 0
+    for upload in uploads.iterator():
+        delete_upload(upload)
+        deleted += 1
+    return deleted
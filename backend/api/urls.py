@@ -2,9 +2,12 @@ from django.urls import include, path, re_path
 from rest_framework import routers
 
 from api.views import (
+    CatalogView,
     IngredientViewSet,
     RecipeViewSet,
     TagViewSet,
+    UploadDetailView,
+    UploadView,
     UserViewSet
 )
 
@@ -16,6 +19,10 @@ router.register('tags', TagViewSet, basename='tags')
 
 urlpatterns = [
     re_path(r'^auth/', include('djoser.urls.authtoken')),
+    path('catalog/', CatalogView.as_view(), name='catalog'),
+    path('uploads/', UploadView.as_view(), name='uploads'),
+    path('uploads/<str:token>/', UploadDetailView.as_view(),
+         name='upload-detail'),
     path('', include(router.urls))
 
 ]
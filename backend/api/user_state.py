@@ -0,0 +1,48 @@
+"""Состояние пользователя: избранное, список покупок и подписки.
+
+Клиент получает полные множества id один раз, а затем только изменения
+после курсора - номера последней известной ему записи UserStateChange.
+Это позволяет запрашивать страницы рецептов без полей, зависящих от
+пользователя, и накладывать состояние на клиенте.
+"""
+from django.db.models import Max
+
+from recipes.models import FavoriteRecipe, ShoppingcartRecipe
+from users.models import Subscription, UserStateChange
+
+STATE_QUERYSETS = (
+    (UserStateChange.FAVORITE, FavoriteRecipe, 'recipe_id'),
+    (UserStateChange.SHOPPING_CART, ShoppingcartRecipe, 'recipe_id'),
+    (UserStateChange.SUBSCRIPTION, Subscription, 'following_id'),
+)
+
+
+def get_cursor(user):
+    return user.state_changes.aggregate(cursor=Max('seq'))['cursor'] or 0
+
+
+def get_state(user):
+    """Полное состояние пользователя."""
+    state = {'cursor': get_cursor(user)}
+    for kind, model, field in STATE_QUERYSETS:
+        state[kind] = list(model.objects.filter(user=user).order_by(
+            field).values_list(field, flat=True))
+    return state
+
+
+def get_state_changes(user, since):
+    """Изменения состояния пользователя после курсора since."""
+    cursor = get_cursor(user)
+    last_changes = {}
+    for kind, object_id, deleted in user.state_changes.filter(
+            seq__gt=since, seq__lte=cursor).order_by('seq').values_list(
+                'kind', 'object_id', 'deleted'):
+        last_changes[kind, object_id] = deleted
+    changes = {
+        'cursor': cursor,
+        'added': {kind: [] for kind, _ in UserStateChange.KINDS},
+        'removed': {kind: [] for kind, _ in UserStateChange.KINDS},
+    }
+    for (kind, object_id), deleted in sorted(last_changes.items()):
+        changes['removed' if deleted else 'added'][kind].append(object_id)
+    return changes
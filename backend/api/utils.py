@@ -1,28 +1,203 @@
+from datetime import timedelta
+from functools import wraps
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from api.constants import IDEMPOTENCY_KEY_TTL
+from api.db import retry_on_locked
+from api.models import IdempotencyKey
+from recipes.constants import TRENDING_CART_WEIGHT, TRENDING_FAVORITE_WEIGHT
+from recipes.models import FavoriteRecipe, Recipe, ShoppingcartRecipe
+from recipes.trending import record_event
+from users.models import Subscription, UserStateChange
+
+ALREADY_ADDED_MESSAGES = {
+    FavoriteRecipe: 'Вы уже добавили этот рецепт в избранные.',
+    ShoppingcartRecipe: 'Вы уже добавили этот рецепт в корзину.',
+}
+STATE_KINDS = {
+    FavoriteRecipe: UserStateChange.FAVORITE,
+    ShoppingcartRecipe: UserStateChange.SHOPPING_CART,
+    Subscription: UserStateChange.SUBSCRIPTION,
+}
+TRENDING_WEIGHTS = {
+    FavoriteRecipe: TRENDING_FAVORITE_WEIGHT,
+    ShoppingcartRecipe: TRENDING_CART_WEIGHT,
+}
+
+
+def insert_or_ignore(model, **values):
+    """Добавляет запись одним запросом INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает True, если запись добавлена, и False, если такая запись
+    уже была. В отличие от проверки валидатором и последующего INSERT
+    не приводит к IntegrityError при одновременных запросах.
+    """
+    meta = model._meta
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(meta.get_field(name).column) for name in values)
+    placeholders = ', '.join(['%s'] * len(values))
+    sql = (f'INSERT INTO {quote(meta.db_table)} ({columns}) '
+           f'VALUES ({placeholders}) '
+           f'ON CONFLICT DO NOTHING RETURNING {quote(meta.pk.column)}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [getattr(value, 'pk', value)
+                             for value in values.values()])
+        return cursor.fetchone() is not None
+
+
+def idempotent(view_method):
+    """Повторяет сохраненный ответ для повторного Idempotency-Key.
+
+    Ответ запоминается в базе для пользователя, метода, адреса и ключа
+    на IDEMPOTENCY_KEY_TTL, поэтому повторная отправка того же запроса
+    клиентом не меняет результат, в какой бы воркер она ни попала.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey.KEY_LENGTH:
+            raise ValidationError({'Idempotency-Key': [
+                f'Не длиннее {IdempotencyKey.KEY_LENGTH} символов.']})
+        lookup = {'user': request.user, 'key': key,
+                  'method': request.method,
+                  'path': request.path[:IdempotencyKey.PATH_LENGTH]}
+        threshold = timezone.now() - timedelta(seconds=IDEMPOTENCY_KEY_TTL)
+        saved = IdempotencyKey.objects.filter(
+            **lookup, created__gte=threshold).values_list(
+                'data', 'status_code').first()
+        if saved is not None:
+            data, status_code = saved
+            return Response(data, status=status_code)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except APIException as error:
+            # Ошибку запроса тоже повторяем: иначе повтор выполнится
+            # заново и может вернуть другой ответ.
+            response = self.handle_exception(error)
+        if response.status_code < status.HTTP_500_INTERNAL_SERVER_ERROR:
+            save_idempotency_key(lookup, response, threshold)
+        return response
+    return wrapper
+
+
+@retry_on_locked
+def save_idempotency_key(lookup, response, threshold):
+    """Сохраняет ответ, удаляя устаревшие ключи пользователя."""
+    IdempotencyKey.objects.filter(
+        user=lookup['user'], created__lt=threshold).delete()
+    # Ответ одновременного запроса с тем же ключом уже мог сохраниться.
+    IdempotencyKey.objects.bulk_create([IdempotencyKey(
+        **lookup, status_code=response.status_code, data=response.data)],
+        ignore_conflicts=True)
 
 
-def add_recipe_to(user, recipe, serializer):
+@retry_on_locked
+def add_relation(user, model, field, obj):
+    """Добавляет связь пользователя и пишет ее в журнал состояния.
+
+    Возвращает False, если связь уже была.
+    """
+    with transaction.atomic():
+        if not insert_or_ignore(model, user=user, **{field: obj}):
+            return False
+        UserStateChange.record(user, STATE_KINDS[model], [obj.pk])
+    return True
+
+
+@retry_on_locked
+def remove_relation(user, model, field, pk):
+    """Удаляет связь пользователя и пишет удаление в журнал состояния.
+
+    Возвращает False, если связи не было.
+    """
+    with transaction.atomic():
+        deleted_count, _ = model.objects.filter(
+            user=user, **{f'{field}_id': pk}).delete()
+        if not deleted_count:
+            return False
+        UserStateChange.record(user, STATE_KINDS[model], [int(pk)],
+                               deleted=True)
+    return True
+
+
+def add_recipe_to(user, recipe, model, serializer):
     """Общий метод для добавления рецепта в избранное или корзину."""
-    data = {'user': user.id, 'recipe': recipe.id}
-    serializer = serializer(data=data)
-    serializer.is_valid(raise_exception=True)
-    serializer.save()
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    if not add_relation(user, model, 'recipe', recipe):
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+            ALREADY_ADDED_MESSAGES[model]]})
+    record_event(recipe.id, TRENDING_WEIGHTS[model])
+    return Response(serializer(recipe).data, status=status.HTTP_201_CREATED)
 
 
-def remove_recipe_from(user, recipe, model):
+def remove_recipe_from(user, pk, model):
     """Обощий метод для удаления рецепта из избранного или корзины."""
-    deleted_count, _ = model.objects.filter(
-        user=user, recipe=recipe).delete()
-    if deleted_count == 0:
+    if not remove_relation(user, model, 'recipe', pk):
+        get_object_or_404(Recipe, pk=pk)
         return Response({'detail': 'Рецепт не найден'},
                         status=status.HTTP_400_BAD_REQUEST)
+    record_event(int(pk), -TRENDING_WEIGHTS[model])
     return Response({'detail': 'Рецепт удален'},
                     status=status.HTTP_204_NO_CONTENT)
 
 
+@retry_on_locked
+@transaction.atomic
+def save_batch(user, targets, model, field, delete):
+    """Добавляет или удаляет связи пользователя одним запросом."""
+    if delete:
+        model.objects.filter(
+            user=user, **{f'{field}__in': targets}).delete()
+    else:
+        model.objects.bulk_create(
+            (model(user=user, **{f'{field}_id': pk}) for pk in targets),
+            ignore_conflicts=True)
+    UserStateChange.record(user, STATE_KINDS[model], targets,
+                           deleted=delete)
+
+
+def apply_batch(user, ids, queryset, model, field, delete=False):
+    """Пакетно добавляет или удаляет связи пользователя.
+
+    queryset - объекты, на которые ссылается поле field модели model
+    (рецепты или авторы). Проверка выполняется одним запросом, изменение -
+    одним bulk INSERT или DELETE. Возвращает результат по каждому id.
+    """
+    ids = list(dict.fromkeys(ids))
+    found = dict(queryset.filter(pk__in=ids).annotate(
+        is_added=Exists(model.objects.filter(
+            user=user, **{field: OuterRef('pk')}))
+    ).values_list('pk', 'is_added'))
+    targets = [pk for pk, is_added in found.items() if is_added == delete]
+    done, skipped = ('deleted', 'not_added') if delete else (
+        'created', 'exists')
+    if targets:
+        save_batch(user, targets, model, field, delete)
+    if model in TRENDING_WEIGHTS:
+        weight = TRENDING_WEIGHTS[model] * (-1 if delete else 1)
+        for pk in targets:
+            record_event(pk, weight)
+    results = []
+    for pk in ids:
+        if pk not in found:
+            result = 'not_found'
+        else:
+            result = done if found[pk] == delete else skipped
+        results.append({'id': pk, 'status': result})
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
 def create_file(total_ingredients):
     """Формирование файла покупок."""
     content = ''
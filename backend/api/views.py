@@ -1,32 +1,82 @@
+import os
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.db.models import Sum
-from django.shortcuts import get_object_or_404
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.cache import patch_cache_control
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import (
     IsAuthenticated,
     IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
 from api.base_views import TagIngredientBaseViewSet
+from api.breaker import DegradedModeMixin
+from api.catalog import get_changes, get_snapshot_name
+from api.compression import PrecompressedCacheMixin
+from api.constants import (
+    FEED_CACHE_TTL,
+    PUBLIC_CACHE_MAX_AGE,
+    RECIPES_STATEMENT_TIMEOUT,
+    USER_STATE_PARAM
+)
+from api.export import (
+    build_archive,
+    get_etag,
+    parse_range,
+    read_range,
+    stream_archive
+)
+from api.fieldsets import (
+    prune_recipe_queryset,
+    prune_user_queryset,
+    requested_fields
+)
 from api.filters import IngredientFilter, RecipeFilter
+from api.invalidation import get_events_version
+from api.models import InvalidationEvent, Upload
 from api.permissions import IsAuthorOrReadOnly
+from api.purge import delete_recipe, delete_user
+from api.read_model import read_documents
 from api.serializers import (
+    USER_STATE_FIELDS,
     AvatarSerializer,
-    FavoriteSerializer,
+    BatchSerializer,
     IngredientSerializer,
     RecipeReadSerializer,
     RecipeWriteSerializer,
-    ShoppingcartSerializer,
-    SubscriptionSerializer,
+    ShortRecipeReadSerializer,
     TagSerializer,
     UserSerializer,
     UserSubscribeRecipesCountSerializer
 )
-from api.utils import add_recipe_to, create_file, remove_recipe_from
+from api.uploads import (
+    UploadConflict,
+    create_upload,
+    write_chunk
+)
+from api.user_state import get_state, get_state_changes
+from api.utils import (
+    add_recipe_to,
+    add_relation,
+    apply_batch,
+    create_file,
+    idempotent,
+    remove_recipe_from,
+    remove_relation
+)
+from recipes.constants import TRENDING_VIEW_WEIGHT
 from recipes.models import (
     FavoriteRecipe,
     Ingredient,
@@ -35,10 +85,15 @@ from recipes.models import (
     ShoppingcartRecipe,
     Tag
 )
+from recipes.trending import record_event
+from recipes.view_counter import record_view
 from users.models import Subscription
 
 User = get_user_model()
 
+# Фильтры рецептов, зависящие от текущего пользователя.
+USER_STATE_FILTERS = {'is_favorited', 'is_in_shopping_cart'}
+
 
 class TagViewSet(TagIngredientBaseViewSet):
     """Представление для меток."""
@@ -56,36 +111,274 @@ class IngredientViewSet(TagIngredientBaseViewSet):
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class CatalogView(APIView):
+    """Представление для синхронизации справочников.
+
+    Без параметров перенаправляет на снимок текущей версии, с параметром
+    since возвращает изменения после этой версии.
+    """
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return redirect(request.build_absolute_uri(
+                default_storage.url(get_snapshot_name())))
+        if not since.isdigit():
+            raise ValidationError(
+                {'since': ['Версия должна быть целым неотрицательным '
+                           'числом.']})
+        return Response(get_changes(int(since)))
+
+
+def upload_response(upload, status_code=status.HTTP_200_OK):
+    response = Response({
+        'token': upload.token,
+        'size': upload.size,
+        'offset': upload.received,
+        'completed': upload.completed,
+    }, status=status_code)
+    response['Upload-Offset'] = upload.received
+    return response
+
+
+def get_offset(request, name):
+    """Неотрицательное целое из заголовка или None без заголовка."""
+    value = request.headers.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: ['Ожидается целое неотрицательное '
+                                      'число.']})
+    return int(value)
+
+
+class UploadView(APIView):
+    """Загрузка изображения потоком (см. api.uploads).
+
+    Тело запроса - само изображение или multipart с полем file. С
+    заголовком Upload-Length создается загрузка по частям.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        if request.content_type.startswith('multipart/form-data'):
+            # Файл из multipart пишется во временный файл, а не в память.
+            request._request.upload_handlers = [
+                TemporaryFileUploadHandler(request._request)]
+            file = request.data.get('file')
+            if file is None:
+                raise ValidationError({'file': ['Обязательное поле.']})
+            upload = create_upload(request.user)
+            write_chunk(upload, file, 0)
+        else:
+            upload = create_upload(
+                request.user, get_offset(request, 'Upload-Length'))
+            if upload.size is None or request.stream is not None:
+                write_chunk(upload, request.stream, 0)
+        return upload_response(upload, status.HTTP_201_CREATED)
+
+
+class UploadDetailView(APIView):
+    """Состояние загрузки и запись следующей части."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_upload(self, request, token):
+        return get_object_or_404(Upload, token=token, user=request.user)
+
+    def get(self, request, token):
+        return upload_response(self.get_upload(request, token))
+
+    def patch(self, request, token):
+        upload = self.get_upload(request, token)
+        offset = get_offset(request, 'Upload-Offset')
+        if offset is None:
+            raise ValidationError({'Upload-Offset': ['Обязательный '
+                                                     'заголовок.']})
+        try:
+            write_chunk(upload, request.stream, offset)
+        except UploadConflict:
+            upload.refresh_from_db()
+            return upload_response(upload, status.HTTP_409_CONFLICT)
+        return upload_response(upload)
+
+
+class RecipeViewSet(DegradedModeMixin, PrecompressedCacheMixin,
+                    viewsets.ModelViewSet):
     """Представление для рецептов."""
 
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = [IsAuthorOrReadOnly, IsAuthenticatedOrReadOnly]
+    precompressed_cache_ttl = FEED_CACHE_TTL
+    statement_timeout = RECIPES_STATEMENT_TIMEOUT
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if (self.action == 'list'
+                and self.request.query_params.get('ordering') == 'trending'):
+            queryset = queryset.filter(trending__isnull=False).order_by(
+                'trending__rank')
+        if (self.action in ('list', 'retrieve')
+                and not settings.RECIPE_READ_MODEL):
+            queryset = prune_recipe_queryset(
+                queryset, RecipeReadSerializer.Meta.fields,
+                self.get_response_fields(), self.request.user)
+        return queryset
+
+    def get_response_fields(self):
+        """Поля ответа с учетом параметров fields, omit и user_state."""
+        fields = requested_fields(
+            self.request, RecipeReadSerializer.Meta.fields)
+        if self.omit_user_state():
+            fields = [name for name in fields
+                      if name not in USER_STATE_FIELDS]
+        return fields
+
+    def read_documents(self, request, recipe_ids):
+        """Документы рецептов только с полями ответа."""
+        fields = self.get_response_fields()
+        # Данные пользователя нужны, только если выводится одно из полей,
+        # которые их содержат.
+        user_state = bool({'author', 'is_favorited', 'is_in_shopping_cart'}
+                          & set(fields))
+        return [
+            {name: document[name] for name in fields}
+            for document in read_documents(request, recipe_ids, user_state)
+        ]
+
+    def omit_user_state(self):
+        """Ответ без полей, зависящих от пользователя."""
+        return self.request.query_params.get(USER_STATE_PARAM) in (
+            'false', '0')
+
+    def is_public_request(self, request):
+        """Анонимный запрос или запрос без данных пользователя."""
+        return (('HTTP_AUTHORIZATION' not in request.META
+                 or request.GET.get(USER_STATE_PARAM) in ('false', '0'))
+                and not USER_STATE_FILTERS & set(request.GET))
+
+    def get_cache_version(self):
+        """Номера последних событий об изменении рецептов, меток,
+        ингредиентов и авторов, примененных процессом."""
+        return get_events_version(
+            InvalidationEvent.RECIPE, InvalidationEvent.TAG,
+            InvalidationEvent.INGREDIENT, InvalidationEvent.USER)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['omit_user_state'] = self.omit_user_state()
+        return context
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        # Без данных пользователя ответ одинаков для всех, если фильтры
+        # тоже не зависят от пользователя.
+        if (self.action in ('list', 'retrieve')
+                and response.status_code == status.HTTP_200_OK
+                and self.omit_user_state()
+                and not USER_STATE_FILTERS & set(request.query_params)):
+            patch_cache_control(response, public=True,
+                                max_age=PUBLIC_CACHE_MAX_AGE)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_READ_MODEL:
+            return super().list(request, *args, **kwargs)
+        recipe_ids = self.filter_queryset(self.get_queryset()).values_list(
+            'pk', flat=True)
+        page = self.paginate_queryset(recipe_ids)
+        if page is None:
+            return Response(self.read_documents(request, recipe_ids))
+        return self.get_paginated_response(
+            self.read_documents(request, page))
+
+    def retrieve(self, request, *args, **kwargs):
+        if settings.RECIPE_READ_MODEL:
+            response = self.retrieve_document(request, kwargs['pk'])
+        else:
+            response = super().retrieve(request, *args, **kwargs)
+        if not getattr(request, 'stale_refresh', False):
+            # id берется из адреса: ?fields= и ?omit= могут убрать его
+            # из ответа.
+            recipe_id = int(kwargs['pk'])
+            record_event(recipe_id, TRENDING_VIEW_WEIGHT)
+            record_view(request, recipe_id)
+        return response
+
+    def perform_destroy(self, instance):
+        delete_recipe(instance)
+
+    def retrieve_document(self, request, pk):
+        """Детали рецепта из готового документа."""
+        if not str(pk).isdigit():
+            raise NotFound()
+        documents = self.read_documents(request, [int(pk)])
+        if not documents:
+            raise NotFound()
+        return Response(documents[0])
+
     @action(detail=True, methods=['post', 'delete'], url_path='favorite')
+    @idempotent
     def favorite(self, request, pk=None):
         """Добавление рецепта в избранные."""
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            return add_recipe_to(user, recipe, FavoriteSerializer)
-        return remove_recipe_from(user, recipe, FavoriteRecipe)
+            recipe = get_object_or_404(Recipe, pk=pk)
+            return add_recipe_to(user, recipe, FavoriteRecipe,
+                                 ShortRecipeReadSerializer)
+        return remove_recipe_from(user, pk, FavoriteRecipe)
 
     @action(detail=True, methods=['post', 'delete'], url_path='shopping_cart')
+    @idempotent
     def shopping_cart(self, request, pk=None):
         """Добавление рецепта в список покупок."""
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'POST':
-            return add_recipe_to(user, recipe, ShoppingcartSerializer)
-        return remove_recipe_from(user, recipe, ShoppingcartRecipe)
+            recipe = get_object_or_404(Recipe, pk=pk)
+            return add_recipe_to(user, recipe, ShoppingcartRecipe,
+                                 ShortRecipeReadSerializer)
+        return remove_recipe_from(user, pk, ShoppingcartRecipe)
+
+    def recipe_batch(self, request, model):
+        """Пакетное добавление или удаление рецептов."""
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return apply_batch(request.user, serializer.validated_data['ids'],
+                           Recipe.objects.all(), model, 'recipe',
+                           delete=request.method == 'DELETE')
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='favorite/batch')
+    @idempotent
+    def favorite_batch(self, request):
+        """Пакетное добавление или удаление рецептов из избранного."""
+        return self.recipe_batch(request, FavoriteRecipe)
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart/batch')
+    @idempotent
+    def shopping_cart_batch(self, request):
+        """Пакетное добавление или удаление рецептов из списка покупок."""
+        return self.recipe_batch(request, ShoppingcartRecipe)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Похожие рецепты (рассчитываются build_similar_recipes)."""
+        recipes = Recipe.objects.filter(
+            similar_to__recipe_id=pk).order_by('similar_to__rank')
+        serializer = ShortRecipeReadSerializer(recipes, many=True)
+        if not serializer.data:
+            get_object_or_404(Recipe, pk=pk)
+        return Response(serializer.data)
 
     @action(detail=True, methods=['get'], url_path='get-link')
     def short_link(self, request, pk=None):
@@ -103,7 +396,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Возвращает TXT-файл со списком покупок."""
         user = request.user
         ingredients = RecipeIngredient.objects.filter(
-            recipe__shoppingcartrecipe__user=user).values(
+            recipe__shoppingcartrecipe__user=user,
+            recipe__deleted_at__isnull=True).values(
                 'ingredient__name', 'ingredient__measurement_unit').order_by(
                     'ingredient__name').annotate(total_amount=Sum('amount'))
         return create_file(ingredients)
@@ -114,6 +408,18 @@ class UserViewSet(DjoserUserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            fields = requested_fields(self.request, UserSerializer.Meta.fields)
+            queryset = prune_user_queryset(
+                queryset, UserSerializer.Meta.fields, fields,
+                self.request.user)
+        return queryset
+
+    def perform_destroy(self, instance):
+        delete_user(instance)
+
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
     def me(self, request):
@@ -122,45 +428,120 @@ class UserViewSet(DjoserUserViewSet):
         serializer = self.get_serializer(user)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], url_path='me/state',
+            permission_classes=[IsAuthenticated])
+    def state(self, request):
+        """Избранное, список покупок и подписки текущего пользователя.
+
+        С параметром since возвращает только изменения после курсора.
+        """
+        since = request.query_params.get('since')
+        if since is None:
+            return Response(get_state(request.user))
+        if not since.isdigit():
+            raise ValidationError(
+                {'since': ['Курсор должен быть целым неотрицательным '
+                           'числом.']})
+        return Response(get_state_changes(request.user, int(since)))
+
+    @action(detail=False, methods=['get'], url_path='me/export',
+            permission_classes=[IsAuthenticated])
+    def export(self, request):
+        """Выгрузка всех данных текущего пользователя в ZIP-архив.
+
+        Поддерживает докачку заголовком Range, пока данные не изменились.
+        """
+        user = request.user
+        etag = get_etag(user)
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range', f'"{etag}"')
+        if range_header and if_range == f'"{etag}"':
+            path = build_archive(user, etag)
+            size = os.path.getsize(path)
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(
+                    status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+            if byte_range:
+                start, end = byte_range
+                response = StreamingHttpResponse(
+                    read_range(path, start, end),
+                    status=status.HTTP_206_PARTIAL_CONTENT,
+                    content_type='application/zip')
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+                response['Content-Length'] = end - start + 1
+                return self.export_headers(response, etag)
+        response = StreamingHttpResponse(
+            stream_archive(user, etag), content_type='application/zip')
+        return self.export_headers(response, etag)
+
+    def export_headers(self, response, etag):
+        response['ETag'] = f'"{etag}"'
+        response['Accept-Ranges'] = 'bytes'
+        response['Content-Disposition'] = (
+            'attachment; filename="foodgram_export.zip"')
+        return response
+
     @action(detail=False, methods=['put', 'delete'], url_path='me/avatar',
             permission_classes=[IsAuthenticated])
     def avatar(self, request):
         """Добавить или удалить аватар текущего пользователя."""
         user = request.user
         if request.method == 'PUT':
-            serializer = AvatarSerializer(user, data=request.data)
+            serializer = AvatarSerializer(
+                user, data=request.data, context={'user': user})
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return Response({"avatar": serializer.data['avatar']},
                             status=status.HTTP_200_OK)
-        user.avatar.delete()
-        user.save()
+        # Файл может принадлежать другим записям, его удалит
+        # collect_media_garbage.
+        user.avatar = None
+        user.save(update_fields=('avatar',))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'],
             url_path='subscribe', permission_classes=[IsAuthenticated])
+    @idempotent
     def subscribe(self, request, **kwargs):
         """Подписка на пользователя."""
         pk = kwargs.get('id')
         user = request.user
-        following = get_object_or_404(User, pk=pk)
-        data = {'user': user.id, 'following': following.id}
         if request.method == 'POST':
-            serializer = SubscriptionSerializer(
-                data=data,
-                context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            following = get_object_or_404(User, pk=pk)
+            if following == user:
+                raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Нельзя подписаться на себя.']})
+            if not add_relation(user, Subscription, 'following',
+                                following):
+                raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Нельзя подписаться повторно.']})
+            serializer = UserSubscribeRecipesCountSerializer(
+                following, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        Subscription.objects.filter(user=user, following=following)
-        deleted_count, _ = Subscription.objects.filter(
-            user=user, following=following).delete()
-        if deleted_count == 0:
+        if not remove_relation(user, Subscription, 'following', pk):
+            get_object_or_404(User, pk=pk)
             return Response({'detail': 'Вы не подписаны на пользователя'},
                             status=status.HTTP_400_BAD_REQUEST)
         return Response({'detail': 'Вы отписались от пользователя'},
                         status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='subscriptions/batch',
+            permission_classes=[IsAuthenticated])
+    @idempotent
+    def subscriptions_batch(self, request):
+        """Пакетная подписка на авторов или отписка от них."""
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        return apply_batch(user, serializer.validated_data['ids'],
+                           User.objects.exclude(pk=user.pk), Subscription,
+                           'following', delete=request.method == 'DELETE')
+
     def get_recipes_limit(self, request):
         """Вспомогательная функция для сокращения длины строки"""
         return request.query_params.get('recipes_limit')
@@ -170,7 +551,10 @@ class UserViewSet(DjoserUserViewSet):
     def subscriptions(self, request):
         """Список подписок пользователя."""
         user = request.user
-        followings = User.objects.filter(follower__user=user)
+        fields = UserSubscribeRecipesCountSerializer.Meta.fields
+        followings = prune_user_queryset(
+            User.objects.filter(follower__user=user), fields,
+            requested_fields(request, fields), user)
         page = self.paginate_queryset(followings)
         serializer = UserSubscribeRecipesCountSerializer(
             page,
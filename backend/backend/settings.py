@@ -34,14 +34,27 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.invalidation.InvalidationMiddleware',
+    'api.middleware.LeanSessionMiddleware',
+    'api.middleware.LeanCsrfViewMiddleware',
+    'api.middleware.LeanAuthenticationMiddleware',
+    'api.middleware.LeanMessageMiddleware',
+    'api.middleware.LeanXFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
+# Адреса с аутентификацией только по токену: слои api.middleware
+# пропускают их мимо сессий, CSRF, сообщений и защиты от фреймов
+LEAN_MIDDLEWARE_PREFIXES = ('/api/', '/s/')
+
+# Доля запросов, профилируемых сэмплирующим профилировщиком (0 - выключено)
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+
+# Отдавать список и детали рецептов из готовых JSON-документов
+RECIPE_READ_MODEL = os.getenv('RECIPE_READ_MODEL', 'False').lower() == 'true'
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -79,13 +92,35 @@ DATABASES = {
     }
 }
 """
+# Профиль SQLite для нескольких воркеров на одном узле (см. api.db)
+SQLITE_TUNING = os.getenv('SQLITE_TUNING', 'True').lower() == 'true'
+SQLITE_CONN_MAX_AGE = int(os.getenv('SQLITE_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        # Постоянные соединения: PRAGMA применяются один раз, а кэш
+        # страниц cache_size живет дольше одного запроса.
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE if SQLITE_TUNING else 0,
     }
 }
 
+SQLITE_PRAGMAS = {
+    # Читатели не блокируются писателем.
+    'journal_mode': 'WAL',
+    # В режиме WAL fsync только при контрольной точке: транзакция
+    # не теряет целостность, но может откатиться при сбое питания.
+    'synchronous': 'NORMAL',
+    # Ожидание освобождения базы другим процессом, мс.
+    'busy_timeout': 5000,
+    # Чтение файла базы через mmap, байт.
+    'mmap_size': 256 * 1024 * 1024,
+    # Кэш страниц на соединение, отрицательное значение - КиБ.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -133,13 +168,46 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = '/var/www/backend/media/'
 
+# Каталог архивов выгрузки данных пользователей (не раздается nginx)
+EXPORT_ROOT = os.getenv('EXPORT_ROOT', '/var/www/backend/exports/')
+
+# Каталог загружаемых по частям изображений (не раздается nginx)
+UPLOAD_ROOT = os.getenv('UPLOAD_ROOT', '/var/www/backend/uploads/')
+
+# Публиковать анонимные ответы ленты и рецептов в файлы для nginx.
+# Измененные рецепты перерисовывает команда publish_static --loop.
+STATIC_PUBLISHING = os.getenv('STATIC_PUBLISHING', 'False').lower() == 'true'
+
+# Каталог опубликованных ответов (раздается nginx)
+PUBLISH_ROOT = os.getenv('PUBLISH_ROOT', '/var/www/backend/published/')
+
+# Адрес сайта для ссылок в опубликованных ответах
+PUBLISH_BASE_URL = os.getenv('PUBLISH_BASE_URL', 'http://localhost')
+
+# Кэш Django. LocMemCache по умолчанию отдельный в каждом процессе:
+# его записи в других воркерах сбрасывает api.invalidation. Общий кэш
+# для всех воркеров и серверов задается CACHE_BACKEND и CACHE_LOCATION,
+# например django.core.cache.backends.memcached.PyMemcacheCache и
+# memcached:11211 (нужен пакет pymemcache).
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+if CACHE_BACKEND.endswith('LocMemCache'):
+    # По умолчанию LocMemCache хранит только 300 записей.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10
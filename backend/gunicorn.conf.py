@@ -0,0 +1,28 @@
+"""Настройки gunicorn: загрузка приложения до запуска воркеров.
+
+GUNICORN_PRELOAD=False возвращает загрузку приложения в каждом воркере.
+"""
+import gc
+import os
+
+bind = '0.0.0.0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+if preload_app:
+    # Приложение загружается в Arbiter.setup() сразу после чтения этого
+    # файла, до хука on_starting. Сборка мусора во время загрузки только
+    # перемешивает объекты, которые затем будут заморожены.
+    gc.disable()
+
+
+def when_ready(server):
+    if preload_app:
+        from api.startup import freeze, warm_up
+
+        try:
+            warm_up()
+            freeze()
+        finally:
+            # Воркеры наследуют включенную сборку мусора от мастера.
+            gc.enable()
@@ -1,29 +1,71 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
+from api.admin_utils import (
+    ApproximateCountPaginator,
+    BackgroundDeleteMixin,
+    PrefixSearchMixin
+)
 from recipes.models import (
     FavoriteRecipe,
     Ingredient,
     Recipe,
+    RecipeIngredient,
     ShoppingcartRecipe,
     Tag
 )
+from recipes.signals import recipe_changed
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'slug')
+    search_fields = ('name',)
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(PrefixSearchMixin, admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
+    # Поиск по началу названия использует индекс ingredient_name_prefix_idx.
+    search_fields = ('name__startswith',)
+    ordering = ('name',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    autocomplete_fields = ('ingredient',)
+    min_num = 1
+    extra = 0
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BackgroundDeleteMixin, PrefixSearchMixin, admin.ModelAdmin):
     list_display = (
         'name', 'text', 'author', 'display_tag', 'image', 'display_ingredient',
+        'views', 'viewers', 'display_favorites',
     )
+    list_select_related = ('author',)
+    search_fields = ('name__startswith',)
+    autocomplete_fields = ('author', 'tags')
+    inlines = (RecipeIngredientInline,)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        favorites = FavoriteRecipe.objects.filter(
+            recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+                count=Count('pk')).values('count')
+        return super().get_queryset(request).prefetch_related(
+            'tags', 'ingredients').annotate(
+                favorites_count=Coalesce(Subquery(favorites), 0))
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.set_tags(list(form.instance.tags.all()))
+        recipe_changed.send(sender=Recipe, recipe_ids=[form.instance.pk])
 
     @admin.display(description='Tags')
     def display_tag(self, obj):
@@ -34,12 +76,26 @@ class RecipeAdmin(admin.ModelAdmin):
         return ', '.join(
             [ingredient.name for ingredient in obj.ingredients.all()])
 
+    @admin.display(description='В избранном',
+                   ordering='favorites_count')
+    def display_favorites(self, obj):
+        return obj.favorites_count
 
-@admin.register(FavoriteRecipe)
-class FavoriteRecipeAdmin(admin.ModelAdmin):
+
+class BaseFavoriteAndCartAdmin(PrefixSearchMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('user__username__startswith', 'recipe__name__startswith')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(FavoriteRecipe)
+class FavoriteRecipeAdmin(BaseFavoriteAndCartAdmin):
+    pass
 
 
 @admin.register(ShoppingcartRecipe)
-class ShoppingcartRecipeAdmin(admin.ModelAdmin):
-    list_display = ('user', 'recipe')
+class ShoppingcartRecipeAdmin(BaseFavoriteAndCartAdmin):
+    pass
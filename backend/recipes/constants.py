@@ -10,3 +10,15 @@ MIN_AMOUNT = 1  # Минимальное количество ингредиен
 MAX_AMOUNT = 10000  # Максимальное количество ингредиента
 MAX_LENGTH_M_UNIT = 64  # Максимальная длина поля measurement_unit
 RETURN_TEXT_LEN = 15  # Максимальная длина текста для __str__
+MAX_TAGS = 63  # Количество меток, помещающихся в битовую маску рецепта
+SIMILAR_RECIPES_COUNT = 10  # Количество похожих рецептов для рецепта
+TRENDING_HALF_LIFE_HOURS = 24  # Период полураспада очков популярности, ч
+TRENDING_WINDOW_DAYS = 7  # Окно учета событий для популярных рецептов, дни
+TRENDING_SIZE = 100  # Количество рецептов в списке популярных
+TRENDING_FLUSH_INTERVAL = 10  # Период записи накопленных событий, с
+TRENDING_VIEW_WEIGHT = 1  # Вес просмотра рецепта
+TRENDING_CART_WEIGHT = 2  # Вес добавления в список покупок
+TRENDING_FAVORITE_WEIGHT = 3  # Вес добавления в избранное
+VIEWS_FLUSH_INTERVAL = 10  # Период записи накопленных просмотров, с
+VIEWERS_SKETCH_PRECISION = 10  # Точность HyperLogLog уникальных зрителей
+MAX_LENGTH_CATALOG_KIND = 16  # Максимальная длина названия справочника
@@ -0,0 +1,84 @@
+"""Счетчики с отложенной записью в базу."""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+counters = []
+
+
+class BufferedCounter:
+    """Накапливает приращения в памяти процесса и записывает их пачкой.
+
+    flush получает Counter {ключ: приращение} и записывает его в базу.
+    Запись выполняется при очередном приращении, если с прошлой записи
+    прошло больше interval секунд, явным вызовом flush() и при штатном
+    завершении процесса.
+
+    Если база занята (OperationalError), приращения возвращаются в буфер
+    и записываются со следующей пачкой, при других ошибках пачка
+    отбрасывается. Ошибки записи при приращении и при завершении
+    процесса только логируются.
+    """
+
+    def __init__(self, flush, interval):
+        self._flush = flush
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._reset()
+        counters.append(self)
+
+    def _reset(self):
+        self._counts = Counter()
+
+    def _take(self):
+        """Забирает накопленное состояние, None если оно пустое."""
+        counts = self._counts
+        self._reset()
+        return counts or None
+
+    def _restore(self, counts):
+        self._counts.update(counts)
+
+    def _add(self, key, value):
+        self._counts[key] += value
+
+    def add(self, key, value=1):
+        with self._lock:
+            self._add(key, value)
+            due = time.monotonic() - self._last_flush >= self.interval
+        if due:
+            self.safe_flush()
+
+    def flush(self):
+        with self._lock:
+            state = self._take()
+            self._last_flush = time.monotonic()
+        if state is None:
+            return
+        try:
+            self._flush(state)
+        except OperationalError:
+            with self._lock:
+                self._restore(state)
+            raise
+
+    def safe_flush(self):
+        """flush, который логирует ошибку вместо исключения."""
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Ошибка записи счетчика %s', self._flush.__name__)
+
+
+@atexit.register
+def flush_all():
+    """Записывает накопленные счетчики при завершении процесса."""
+    for counter in counters:
+        counter.safe_flush()
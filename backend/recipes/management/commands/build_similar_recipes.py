@@ -0,0 +1,24 @@
+"""Модуль для расчета похожих рецептов."""
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import build_similar_recipes
+
+
+class Command(BaseCommand):
+    """Класс для расчета похожих рецептов."""
+
+    help = ('Пересчитывает похожие рецепты для рецептов, созданных или '
+            'измененных после прошлого расчета.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать похожие рецепты для всех рецептов.')
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        count = build_similar_recipes(
+            full=options['full'],
+            log=lambda message: self.stdout.write(message))
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты рассчитаны для {count} рецептов'))
@@ -0,0 +1,19 @@
+"""Модуль для пересчета популярных рецептов."""
+from django.core.management.base import BaseCommand
+
+from recipes.trending import materialize_trending
+
+
+class Command(BaseCommand):
+    """Класс для пересчета популярных рецептов.
+
+    Запускается по расписанию (cron), например раз в 5 минут.
+    """
+
+    help = 'Пересчитывает список популярных рецептов.'
+
+    def handle(self, *args, **options):
+        """Основной метод."""
+        count = materialize_trending()
+        self.stdout.write(self.style.SUCCESS(
+            f'В списке популярных {count} рецептов'))
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_trending_recipes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeViewersSketch',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='viewers_sketch', serialize=False, to='recipes.recipe')),
+                ('sketch', models.BinaryField(verbose_name='HyperLogLog')),
+            ],
+            options={
+                'verbose_name': 'зрители рецепта',
+                'verbose_name_plural': 'Зрители рецептов',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='viewers',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Уникальные зрители (оценка)'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='views',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Просмотры'),
+        ),
+    ]
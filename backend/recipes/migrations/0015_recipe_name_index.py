@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_views'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['name'], name='recipe_name_prefix_idx', opclasses=('varchar_pattern_ops',)),
+        ),
+    ]
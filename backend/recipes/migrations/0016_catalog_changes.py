@@ -0,0 +1,40 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:53
+
+from django.db import migrations, models
+
+
+def record_catalog(apps, schema_editor):
+    CatalogChange = apps.get_model('recipes', 'CatalogChange')
+    for kind, model in (('ingredient', 'Ingredient'), ('tag', 'Tag')):
+        object_ids = apps.get_model('recipes', model).objects.order_by(
+            'pk').values_list('pk', flat=True)
+        CatalogChange.objects.bulk_create(
+            CatalogChange(kind=kind, object_id=object_id)
+            for object_id in object_ids.iterator())
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False, verbose_name='Версия')),
+                ('kind', models.CharField(choices=[('ingredient', 'Ингредиент'), ('tag', 'Метка')], max_length=16, verbose_name='Справочник')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Id объекта')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удален')),
+            ],
+            options={
+                'verbose_name': 'изменение справочника',
+                'verbose_name_plural': 'Изменения справочников',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='catalogchange',
+            index=models.Index(fields=['kind', 'object_id'], name='catalog_change_object_idx'),
+        ),
+        migrations.RunPython(record_catalog, migrations.RunPython.noop),
+    ]
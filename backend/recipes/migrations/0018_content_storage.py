@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:17
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(default=None, storage=api.storage.ContentAddressedStorage(), upload_to='recipes/images'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.16 on 2026-10-19 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_content_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'блокировка справочников',
+                'verbose_name_plural': 'Блокировки справочников',
+            },
+        ),
+    ]
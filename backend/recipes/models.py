@@ -1,12 +1,15 @@
 """Модели для рецептов!"""
 import random
 
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 
+from api.storage import media_storage
 from recipes.constants import (
     LENGTH_SHORT_CODE,
+    MAX_LENGTH_CATALOG_KIND,
     MAX_LENGTH_NAME_INGREDIENT,
     MAX_LENGTH_NAME_RECIPE,
     MAX_LENGTH_NAME_TAG,
@@ -16,6 +19,7 @@ from recipes.constants import (
     MIN_AMOUNT,
     MAX_AMOUNT,
     MAX_LENGTH_M_UNIT,
+    MAX_TAGS,
     RETURN_TEXT_LEN,
 )
 
@@ -33,6 +37,11 @@ class Tag(models.Model):
         max_length=MAX_LENGTH_SLUG,
         verbose_name='Слаг'
     )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        editable=False,
+        verbose_name='Бит в маске меток рецепта'
+    )
 
     class Meta:
         verbose_name = 'метка'
@@ -41,6 +50,24 @@ class Tag(models.Model):
     def __str__(self):
         return self.name[:RETURN_TEXT_LEN]
 
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = next(self.free_bits())
+        super().save(*args, **kwargs)
+
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+    @classmethod
+    def free_bits(cls):
+        """Свободные позиции в битовой маске меток."""
+        used = set(cls.objects.values_list('bit', flat=True))
+        for bit in range(MAX_TAGS):
+            if bit not in used:
+                yield bit
+        raise ValidationError(f'Нельзя создать больше {MAX_TAGS} меток.')
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -61,11 +88,99 @@ class Ingredient(models.Model):
                 name='unique_name_measurement_unit'
             ),
         )
+        indexes = (
+            # Поиск по началу названия (name LIKE 'абв%'). На PostgreSQL
+            # varchar_pattern_ops позволяет использовать индекс при любой
+            # локали, остальные СУБД opclasses игнорируют.
+            models.Index(
+                fields=('name',),
+                name='ingredient_name_prefix_idx',
+                opclasses=('varchar_pattern_ops',)
+            ),
+        )
 
     def __str__(self):
         return self.name[:RETURN_TEXT_LEN]
 
 
+class CatalogLock(models.Model):
+    """Строка, блокировкой которой упорядочиваются записи CatalogChange."""
+
+    class Meta:
+        verbose_name = 'блокировка справочников'
+        verbose_name_plural = 'Блокировки справочников'
+
+
+class CatalogChange(models.Model):
+    """Журнал изменений справочников меток и ингредиентов.
+
+    Номер записи - версия справочника. Удаление объекта записывается
+    как изменение с deleted=True. Номера выдаются последовательностью
+    при вставке, а транзакции могут фиксироваться в другом порядке:
+    клиент, получивший версию N, пропустил бы меньший номер,
+    зафиксированный позже. Поэтому запись изменений выполняется под
+    блокировкой строки CatalogLock до конца транзакции, и номера
+    фиксируются по возрастанию.
+    """
+
+    INGREDIENT = 'ingredient'
+    TAG = 'tag'
+    KINDS = (
+        (INGREDIENT, 'Ингредиент'),
+        (TAG, 'Метка'),
+    )
+
+    seq = models.BigAutoField(primary_key=True, verbose_name='Версия')
+    kind = models.CharField(
+        max_length=MAX_LENGTH_CATALOG_KIND,
+        choices=KINDS,
+        verbose_name='Справочник'
+    )
+    object_id = models.PositiveBigIntegerField(verbose_name='Id объекта')
+    deleted = models.BooleanField(default=False, verbose_name='Удален')
+
+    class Meta:
+        verbose_name = 'изменение справочника'
+        verbose_name_plural = 'Изменения справочников'
+        indexes = (
+            models.Index(
+                fields=('kind', 'object_id'),
+                name='catalog_change_object_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.seq}: {self.kind} {self.object_id}'
+
+    @classmethod
+    def kind_of(cls, model):
+        return cls.TAG if model is Tag else cls.INGREDIENT
+
+    @classmethod
+    def record(cls, model, object_ids, deleted=False):
+        """Записывает изменения объектов справочника."""
+        kind = cls.kind_of(model)
+        with transaction.atomic():
+            CatalogLock.objects.select_for_update().get_or_create(pk=1)
+            cls.objects.bulk_create(
+                cls(kind=kind, object_id=object_id, deleted=deleted)
+                for object_id in object_ids)
+
+    @classmethod
+    def record_untracked(cls, model):
+        """Записывает объекты, добавленные в обход сигналов."""
+        cls.record(model, model.objects.exclude(
+            pk__in=cls.objects.filter(kind=cls.kind_of(model)).values(
+                'object_id')).values_list('pk', flat=True))
+
+
+class RecipeManager(models.Manager):
+    """Менеджер рецептов без помеченных на удаление."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='recipes', verbose_name='Автор')
@@ -82,6 +197,7 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/images',
+        storage=media_storage,
         default=None
     )
     name = models.CharField(
@@ -98,12 +214,36 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField('Дата пуликации', auto_now_add=True)
     short_code = models.CharField(max_length=LENGTH_SHORT_CODE, unique=True)
+    # Денормализованные метки рецепта: бит Tag.bit установлен для каждой
+    # метки. Позволяет фильтровать ленту по меткам без JOIN.
+    tags_mask = models.BigIntegerField(
+        default=0, editable=False, verbose_name='Маска меток')
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+    views = models.PositiveIntegerField(
+        'Просмотры', default=0, editable=False)
+    viewers = models.PositiveIntegerField(
+        'Уникальные зрители (оценка)', default=0, editable=False)
+    similar_built = models.DateTimeField(
+        'Дата расчета похожих рецептов', null=True, editable=False)
+    # Рецепт скрыт сразу, а связанные записи удаляются в фоне
+    # (см. api.purge).
+    deleted_at = models.DateTimeField(
+        'Дата удаления', null=True, blank=True, editable=False)
+
+    objects = RecipeManager()
+    all_objects = models.Manager()
 
     def save(self, *args, **kwargs):
         if not self.short_code:
             self.short_code = self.generate_unique_shortcode()
         super().save(*args, **kwargs)
 
+    def set_tags(self, tags):
+        """Устанавливает метки рецепта и обновляет маску меток."""
+        self.tags.set(tags)
+        self.tags_mask = sum(tag.mask for tag in tags)
+        Recipe.objects.filter(pk=self.pk).update(tags_mask=self.tags_mask)
+
     def generate_unique_shortcode(self):
         code = ''
         allowed_chars = (
@@ -112,7 +252,7 @@ class Recipe(models.Model):
         while True:
             code = ''.join(
                 random.choice(allowed_chars) for _ in range(LENGTH_SHORT_CODE))
-            if not Recipe.objects.filter(short_code=code).exists():
+            if not Recipe.all_objects.filter(short_code=code).exists():
                 break
         return code
 
@@ -120,11 +260,109 @@ class Recipe(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(fields=('-pub_date',), name='recipe_pub_date_idx'),
+            # Поиск по началу названия в админке.
+            models.Index(
+                fields=('name',),
+                name='recipe_name_prefix_idx',
+                opclasses=('varchar_pattern_ops',)
+            ),
+            # Фильтр по автору и срез рецептов в подписках.
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name[:RETURN_TEXT_LEN]
 
 
+class SimilarRecipe(models.Model):
+    """Предрассчитанный похожий рецепт (см. recipes.similarity)."""
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='similar')
+    similar = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='similar_to')
+    score = models.FloatField('Сходство')
+    rank = models.PositiveSmallIntegerField('Место')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'rank'),
+                name='unique_similar_recipe_rank'
+            ),
+        )
+
+    def __str__(self):
+        return self.similar.name[:RETURN_TEXT_LEN]
+
+
+class RecipeViewersSketch(models.Model):
+    """HyperLogLog уникальных зрителей рецепта.
+
+    Хранится отдельно от Recipe, чтобы не загружать его в запросах ленты.
+    """
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        related_name='viewers_sketch')
+    sketch = models.BinaryField('HyperLogLog')
+
+    class Meta:
+        verbose_name = 'зрители рецепта'
+        verbose_name_plural = 'Зрители рецептов'
+
+    def __str__(self):
+        return self.recipe.name[:RETURN_TEXT_LEN]
+
+
+class RecipeActivity(models.Model):
+    """Очки популярности рецепта за час (см. recipes.trending)."""
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='activity')
+    bucket = models.DateTimeField('Час')
+    score = models.FloatField('Очки', default=0)
+
+    class Meta:
+        verbose_name = 'активность рецепта'
+        verbose_name_plural = 'Активность рецептов'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'bucket'),
+                name='unique_recipe_activity_bucket'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('bucket',),
+                name='recipe_activity_bucket_idx'
+            ),
+        )
+
+    def __str__(self):
+        return self.recipe.name[:RETURN_TEXT_LEN]
+
+
+class TrendingRecipe(models.Model):
+    """Материализованный список популярных рецептов."""
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, related_name='trending')
+    rank = models.PositiveIntegerField('Место', unique=True)
+    score = models.FloatField('Очки')
+
+    class Meta:
+        ordering = ('rank',)
+        verbose_name = 'популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+
+    def __str__(self):
+        return self.recipe.name[:RETURN_TEXT_LEN]
+
+
 class RecipeTag(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
@@ -0,0 +1,31 @@
+"""Сигналы для рецептов."""
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from recipes.models import CatalogChange, Ingredient, Recipe, Tag
+
+# Рецепт создан или изменен вместе с метками и ингредиентами.
+# Аргумент recipe_ids - id измененных рецептов.
+recipe_changed = Signal()
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    """Сбрасывает бит удаленной метки в масках рецептов."""
+    Recipe.objects.alias(
+        matched_tags=F('tags_mask').bitand(instance.mask)
+    ).filter(matched_tags__gt=0).update(
+        tags_mask=F('tags_mask').bitand(~instance.mask))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def record_catalog_change(sender, instance, **kwargs):
+    CatalogChange.record(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def record_catalog_deletion(sender, instance, **kwargs):
+    CatalogChange.record(sender, [instance.pk], deleted=True)
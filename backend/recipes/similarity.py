@@ -0,0 +1,194 @@
+"""Расчет похожих рецептов по общим ингредиентам и меткам.
+
+Рецепт описывается множеством признаков: id ингредиентов и id меток со
+знаком минус. Сходство двух рецептов - коэффициент Жаккара их признаков.
+Кандидаты в похожие ищет база соединением таблиц признаков, в котором
+не участвуют частые признаки (соль, вода, популярные метки): они почти
+не влияют на сходство, но дают квадратичное число пар. Признак частый,
+если он есть больше чем у MAX_FEATURE_SHARE и больше чем у
+MAX_FEATURE_RECIPES рецептов, поэтому число пар растет линейно от
+числа рецептов.
+
+Рецепты обрабатываются пачками по CHUNK_SIZE: в памяти хранятся только
+признаки рецептов пачки и их кандидатов, и расход памяти не зависит от
+размера базы.
+"""
+import heapq
+from itertools import chain
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from recipes.constants import SIMILAR_RECIPES_COUNT
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+CHUNK_SIZE = 500  # Количество рецептов, обрабатываемых за раз
+CANDIDATES_COUNT = 100  # Кандидатов для точного расчета сходства
+MAX_FEATURE_SHARE = 0.05  # Доля рецептов, выше которой признак частый
+MAX_FEATURE_RECIPES = 1000  # Число рецептов, выше которого признак частый
+QUERY_BATCH_SIZE = 900  # Количество id в одном запросе признаков
+
+# Таблицы признаков: (модель, поле признака, знак id признака).
+FEATURES = (
+    (RecipeIngredient, 'ingredient', 1),
+    (Recipe.tags.through, 'tag', -1),
+)
+
+
+def find_frequent_features():
+    """Возвращает id частых признаков для каждой таблицы FEATURES."""
+    max_frequency = max(2, min(
+        MAX_FEATURE_RECIPES,
+        int(Recipe.all_objects.count() * MAX_FEATURE_SHARE)))
+    return [
+        list(model.objects.order_by().values(f'{field}_id').annotate(
+            count=Count('pk')).filter(count__gt=max_frequency).values_list(
+                f'{field}_id', flat=True))
+        for model, field, _ in FEATURES
+    ]
+
+
+def find_candidates(recipe_ids, frequent):
+    """Возвращает {id рецепта: [id кандидатов]}.
+
+    Кандидаты - CANDIDATES_COUNT рецептов с наибольшим числом общих
+    редких признаков, строки пар читаются из базы потоком.
+    """
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    parts, params = [], []
+    for (model, field, _), excluded in zip(FEATURES, frequent):
+        meta = model._meta
+        table = quote(meta.db_table)
+        recipe = quote(meta.get_field('recipe').column)
+        feature = quote(meta.get_field(field).column)
+        sql = (f'SELECT a.{recipe} AS recipe, b.{recipe} AS candidate '
+               f'FROM {table} a JOIN {table} b ON b.{feature} = a.{feature} '
+               f'AND b.{recipe} <> a.{recipe} '
+               f'WHERE a.{recipe} IN ({placeholders})')
+        params.extend(recipe_ids)
+        if excluded:
+            sql += (f' AND a.{feature} NOT IN '
+                    f'({", ".join(["%s"] * len(excluded))})')
+            params.extend(excluded)
+        parts.append(sql)
+    candidates = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT recipe, candidate, COUNT(*) AS common '
+            f'FROM ({" UNION ALL ".join(parts)}) pairs '
+            f'GROUP BY recipe, candidate '
+            f'ORDER BY recipe, common DESC, candidate', params)
+        for recipe_id, candidate_id, _ in cursor:
+            recipe_candidates = candidates.setdefault(recipe_id, [])
+            if len(recipe_candidates) < CANDIDATES_COUNT:
+                recipe_candidates.append(candidate_id)
+    return candidates
+
+
+def load_features(recipe_ids):
+    """Загружает признаки рецептов: {id рецепта: множество признаков}."""
+    features = {}
+    recipe_ids = sorted(recipe_ids)
+    for start in range(0, len(recipe_ids), QUERY_BATCH_SIZE):
+        batch = recipe_ids[start:start + QUERY_BATCH_SIZE]
+        for model, field, sign in FEATURES:
+            for recipe_id, feature_id in model.objects.filter(
+                    recipe_id__in=batch).order_by().values_list(
+                        'recipe_id', f'{field}_id'):
+                features.setdefault(recipe_id, set()).add(sign * feature_id)
+    return features
+
+
+def find_similar(recipe_id, candidate_ids, features):
+    """Возвращает [(сходство, id рецепта)] для самых похожих рецептов."""
+    recipe_features = features.get(recipe_id, set())
+    scores = []
+    for candidate_id in candidate_ids:
+        candidate_features = features[candidate_id]
+        common = len(recipe_features & candidate_features)
+        scores.append((
+            common / (len(recipe_features) + len(candidate_features)
+                      - common),
+            candidate_id))
+    return heapq.nlargest(SIMILAR_RECIPES_COUNT, scores)
+
+
+def save_similar(similar_by_recipe):
+    """Перезаписывает списки похожих рецептов одной пачкой."""
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(
+            recipe_id__in=similar_by_recipe).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score, rank=rank)
+            for recipe_id, similar in similar_by_recipe.items()
+            for rank, (score, similar_id) in enumerate(similar))
+
+
+def merge_into_neighbours(changed):
+    """Добавляет измененные рецепты в списки их соседей.
+
+    Сходство симметрично: если рецепт B попал в список рецепта A, то A
+    может вытеснить последний рецепт из списка B.
+    """
+    candidates = {}
+    for recipe_id, similar in changed.items():
+        for score, similar_id in similar:
+            candidates.setdefault(similar_id, []).append((score, recipe_id))
+    neighbour_ids = list(candidates)
+    for start in range(0, len(neighbour_ids), CHUNK_SIZE):
+        chunk = neighbour_ids[start:start + CHUNK_SIZE]
+        current = {recipe_id: [] for recipe_id in chunk}
+        for recipe_id, similar_id, score in SimilarRecipe.objects.filter(
+                recipe_id__in=chunk).values_list(
+                    'recipe_id', 'similar_id', 'score'):
+            current[recipe_id].append((score, similar_id))
+        save_similar({
+            recipe_id: heapq.nlargest(
+                SIMILAR_RECIPES_COUNT,
+                set(similar) | set(candidates[recipe_id]))
+            for recipe_id, similar in current.items()
+        })
+
+
+def build_similar_recipes(full=False, log=None):
+    """Пересчитывает похожие рецепты.
+
+    По умолчанию пересчитываются только рецепты, созданные или
+    измененные после прошлого расчета, а они сами добавляются в списки
+    своих соседей. При full=True пересчитываются все рецепты.
+    """
+    started = timezone.now()
+    frequent = find_frequent_features()
+    recipes = Recipe.objects.order_by('pk')
+    if not full:
+        recipes = recipes.filter(
+            Q(similar_built__isnull=True)
+            | Q(similar_built__lt=F('updated')))
+        SimilarRecipe.objects.filter(similar__in=recipes).delete()
+    total = recipes.count()
+    done = last_id = 0
+    while True:
+        chunk = list(recipes.filter(pk__gt=last_id).values_list(
+            'pk', flat=True)[:CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1]
+        candidates = find_candidates(chunk, frequent)
+        features = load_features(
+            set(chain(chunk, *candidates.values())))
+        similar = {
+            recipe_id: find_similar(
+                recipe_id, candidates.get(recipe_id, ()), features)
+            for recipe_id in chunk
+        }
+        save_similar(similar)
+        if not full:
+            merge_into_neighbours(similar)
+        Recipe.objects.filter(pk__in=chunk).update(similar_built=started)
+        done += len(chunk)
+        if log:
+            log(f'Рассчитано рецептов: {done} из {total}')
+    return done
@@ -0,0 +1,87 @@
+"""Популярные рецепты с экспоненциальным затуханием очков.
+
+События (просмотр, добавление в избранное или корзину) накапливаются в
+памяти процесса и записываются пачкой в почасовые счетчики
+RecipeActivity. Команда materialize_trending по расписанию суммирует
+счетчики за окно TRENDING_WINDOW_DAYS с затуханием и сохраняет первые
+TRENDING_SIZE рецептов в TrendingRecipe.
+"""
+import heapq
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.db import retry_on_locked
+from recipes.constants import (
+    TRENDING_FLUSH_INTERVAL,
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_SIZE,
+    TRENDING_WINDOW_DAYS
+)
+from recipes.counters import BufferedCounter
+from recipes.models import Recipe, RecipeActivity, TrendingRecipe
+
+
+def current_bucket():
+    return timezone.now().replace(minute=0, second=0, microsecond=0)
+
+
+@retry_on_locked
+def save_activity(counts):
+    """Прибавляет очки к почасовым счетчикам одним пакетным UPSERT.
+
+    Очки рецептов, удаленных после события, отбрасываются.
+    """
+    meta = RecipeActivity._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    recipe = quote(meta.get_field('recipe').column)
+    bucket = quote(meta.get_field('bucket').column)
+    score = quote(meta.get_field('score').column)
+    sql = (f'INSERT INTO {table} ({recipe}, {bucket}, {score}) '
+           f'VALUES (%s, %s, %s) ON CONFLICT ({recipe}, {bucket}) '
+           f'DO UPDATE SET {score} = {table}.{score} + excluded.{score}')
+    field = meta.get_field('bucket')
+    existing = set(Recipe.all_objects.filter(pk__in={
+        recipe_id for recipe_id, _ in counts}).values_list('pk', flat=True))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (recipe_id, field.get_db_prep_value(hour, connection), value)
+            for (recipe_id, hour), value in counts.items()
+            if recipe_id in existing])
+
+
+activity = BufferedCounter(save_activity, TRENDING_FLUSH_INTERVAL)
+
+
+def record_event(recipe_id, weight):
+    """Учитывает событие рецепта, weight < 0 для отмены действия."""
+    activity.add((recipe_id, current_bucket()), weight)
+
+
+def materialize_trending():
+    """Пересчитывает список популярных рецептов.
+
+    Удаляет счетчики старше окна и возвращает количество рецептов в списке.
+    """
+    now = timezone.now()
+    window_start = now - timedelta(days=TRENDING_WINDOW_DAYS)
+    scores = {}
+    for recipe_id, bucket, score in RecipeActivity.objects.filter(
+            bucket__gte=window_start).values_list(
+                'recipe_id', 'bucket', 'score').iterator():
+        age = (now - bucket).total_seconds() / 3600
+        scores[recipe_id] = scores.get(recipe_id, 0) + score * 0.5 ** (
+            age / TRENDING_HALF_LIFE_HOURS)
+    top = heapq.nlargest(
+        TRENDING_SIZE,
+        ((score, recipe_id) for recipe_id, score in scores.items()
+         if score > 0))
+    with transaction.atomic():
+        TrendingRecipe.objects.all().delete()
+        TrendingRecipe.objects.bulk_create(
+            TrendingRecipe(recipe_id=recipe_id, rank=rank, score=score)
+            for rank, (score, recipe_id) in enumerate(top))
+    RecipeActivity.objects.filter(bucket__lt=window_start).delete()
+    return len(top)
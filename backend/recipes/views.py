@@ -4,19 +4,27 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from api.breaker import DegradedModeMixin
+from api.constants import SHORT_LINK_STATEMENT_TIMEOUT
 from recipes.models import Recipe
+from recipes.view_counter import record_view
 
 User = get_user_model()
 
 
-class ShortLinkRedirectView(APIView):
+class ShortLinkRedirectView(DegradedModeMixin, APIView):
     """Представление для получения короткой ссылки"""
+
+    statement_timeout = SHORT_LINK_STATEMENT_TIMEOUT
+
     def get(self, request, short_code):
         try:
             recipe = Recipe.objects.get(short_code=short_code)
         except Recipe.DoesNotExist:
             return Response({"detail": "Рецепт не найден"},
                             status=status.HTTP_404_NOT_FOUND)
+        if not getattr(request, 'stale_refresh', False):
+            record_view(request, recipe.id)
         scheme = request.scheme
         host = request.get_host()
         return (redirect(f'{scheme}://{host}/recipes/{recipe.id}'))
@@ -3,26 +3,39 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
 
+from api.admin_utils import (
+    ApproximateCountPaginator,
+    BackgroundDeleteMixin,
+    PrefixSearchMixin
+)
 from users.models import Subscription
 
 User = get_user_model()
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(BackgroundDeleteMixin, PrefixSearchMixin, BaseUserAdmin):
     """Настройки админки для модели ModifiedUser."""
 
     model = User
     admin.site.unregister(Group)
     list_display = (
         'username', 'email', 'first_name', 'last_name')
-    search_fields = ('username', 'email')
+    # Поиск по началу строки использует индексы уникальных полей.
+    search_fields = ('username__startswith', 'email__startswith')
     ordering = ('username',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(PrefixSearchMixin, admin.ModelAdmin):
     list_display = (
         'user', 'following'
     )
-    search_fields = ('user',)
+    list_select_related = ('user', 'following')
+    autocomplete_fields = ('user', 'following')
+    search_fields = ('user__username__startswith',
+                     'following__username__startswith')
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
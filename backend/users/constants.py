@@ -2,3 +2,4 @@
 MAX_LENGTH_USERNAME = 150
 MAX_LENGTH_EMAIL = 254
 RETURN_TEXT_LEN = 15  # Максимальная длина текста для __str__
+MAX_LENGTH_STATE_KIND = 16  # Максимальная длина вида изменения состояния
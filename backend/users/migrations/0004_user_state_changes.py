@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_subscription_deny_self_subscription'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStateChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False, verbose_name='Курсор')),
+                ('kind', models.CharField(choices=[('favorites', 'Избранное'), ('shopping_cart', 'Список покупок'), ('subscriptions', 'Подписки')], max_length=16)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='state_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'изменение состояния пользователя',
+                'verbose_name_plural': 'Изменения состояния пользователей',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userstatechange',
+            index=models.Index(fields=['user', 'seq'], name='user_state_change_seq_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:59
+
+import django.contrib.auth.models
+from django.db import migrations, models
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_state_changes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='chef',
+            managers=[
+                ('objects', users.models.ChefManager()),
+                ('all_objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chef',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата удаления'),
+        ),
+    ]
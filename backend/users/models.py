@@ -1,15 +1,24 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.exceptions import ValidationError
 from django.db import models
 
+from api.storage import media_storage
 from users.constants import (
     MAX_LENGTH_EMAIL,
+    MAX_LENGTH_STATE_KIND,
     MAX_LENGTH_USERNAME,
     RETURN_TEXT_LEN
 )
 
 
+class ChefManager(UserManager):
+    """Менеджер пользователей без помеченных на удаление."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Chef(AbstractUser):
     """Модель пользователя (измененная)."""
 
@@ -28,10 +37,19 @@ class Chef(AbstractUser):
     last_name = models.CharField(max_length=MAX_LENGTH_USERNAME)
     avatar = models.ImageField(
         upload_to='users/',
+        storage=media_storage,
         null=True,
         default=None
     )
 
+    # Пользователь скрыт сразу, а его данные удаляются в фоне
+    # (см. api.purge).
+    deleted_at = models.DateTimeField(
+        'Дата удаления', null=True, blank=True, editable=False)
+
+    objects = ChefManager()
+    all_objects = UserManager()
+
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
     class Meta:
@@ -76,3 +94,51 @@ class Subscription(models.Model):
 
     def __str__(self):
         return self.user[:RETURN_TEXT_LEN]
+
+
+class UserStateChange(models.Model):
+    """Журнал изменений избранного, списка покупок и подписок.
+
+    Номер записи - курсор синхронизации состояния пользователя.
+    Для избранного и списка покупок object_id - id рецепта, для
+    подписок - id автора.
+    """
+
+    FAVORITE = 'favorites'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscriptions'
+    KINDS = (
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (SUBSCRIPTION, 'Подписки'),
+    )
+
+    seq = models.BigAutoField(primary_key=True, verbose_name='Курсор')
+    user = models.ForeignKey(
+        Chef,
+        on_delete=models.CASCADE,
+        related_name='state_changes'
+    )
+    kind = models.CharField(max_length=MAX_LENGTH_STATE_KIND, choices=KINDS)
+    object_id = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = 'изменение состояния пользователя'
+        verbose_name_plural = 'Изменения состояния пользователей'
+        indexes = (
+            models.Index(
+                fields=('user', 'seq'),
+                name='user_state_change_seq_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.seq}: {self.kind} {self.object_id}'
+
+    @classmethod
+    def record(cls, user, kind, object_ids, deleted=False):
+        """Записывает изменения состояния пользователя."""
+        cls.objects.bulk_create(
+            cls(user=user, kind=kind, object_id=object_id, deleted=deleted)
+            for object_id in object_ids)